@@ -0,0 +1,232 @@
+import os
+
+import numpy as np
+
+
+class IVFIndex:
+    # Inverted-file index: k-means coarse quantizer, each query scans only
+    # the nprobe closest clusters instead of the whole roster
+    kind = "ivf"
+
+    def __init__(self, nlist=None, nprobe=8, iterations=10, max_points_per_list=64, seed=0):
+        self.nlist = nlist
+        self.max_points_per_list = max_points_per_list
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int64)
+        self.trained_size = 0  # rows the centroids were trained on
+        self._lists = []
+        self._list_arrays = {}
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self.assignments)
+
+    def build(self, encodings):
+        encodings = np.asarray(encodings, dtype=np.float64)
+        nlist = self.nlist or max(1, int(np.sqrt(len(encodings))))
+        nlist = min(nlist, len(encodings))
+        if nlist == 0:
+            return
+
+        # Train on a bounded sample so rebuilding a large roster stays cheap;
+        # every encoding is still assigned to its nearest centroid afterwards
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(encodings), nlist * self.max_points_per_list)
+        sample = encodings[rng.choice(len(encodings), sample_size, replace=False)]
+        centroids = sample[:nlist].copy()
+        for _ in range(self.iterations):
+            labels = self._nearest(sample, centroids, 1)[:, 0]
+            counts = np.bincount(labels, minlength=nlist)
+            order = np.argsort(labels, kind="stable")
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            filled = counts > 0
+            sums = np.add.reduceat(sample[order], starts[filled], axis=0)
+            centroids[filled] = sums / counts[filled, None]
+
+        self.centroids = centroids
+        self.trained_size = len(encodings)
+        self.assignments = np.empty(0, dtype=np.int64)
+        self._lists = [[] for _ in range(nlist)]
+        self._list_arrays = {}
+        self.add(encodings, 0)
+
+    def add(self, encodings, start_row):
+        if not self.is_trained:
+            return
+        encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, self.centroids.shape[1])
+        labels = self._nearest(encodings, self.centroids, 1)[:, 0]
+        for offset, label in enumerate(labels):
+            self._lists[label].append(start_row + offset)
+            self._list_arrays.pop(label, None)
+        self.assignments = np.concatenate([self.assignments, labels])
+
+    def candidates(self, faces):
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = self._nearest(faces, self.centroids, nprobe)
+        results = []
+        for row in probes:
+            arrays = [self._list_array(label) for label in row]
+            results.append(np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int64))
+        return results
+
+    def _list_array(self, label):
+        array = self._list_arrays.get(label)
+        if array is None:
+            array = np.asarray(self._lists[label], dtype=np.int64)
+            self._list_arrays[label] = array
+        return array
+
+    @staticmethod
+    def _nearest(points, centroids, count):
+        sq = (np.einsum("ij,ij->i", points, points)[:, None]
+              + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+              - 2.0 * (points @ centroids.T))
+        if count == 1:
+            return np.argmin(sq, axis=1)[:, None]
+        if count >= centroids.shape[0]:
+            return np.argsort(sq, axis=1)
+        nearest = np.argpartition(sq, count - 1, axis=1)[:, :count]
+        order = np.argsort(np.take_along_axis(sq, nearest, axis=1), axis=1)
+        return np.take_along_axis(nearest, order, axis=1)
+
+    def state(self):
+        return {
+            "nlist": np.int64(len(self.centroids)),
+            "nprobe": np.int64(self.nprobe),
+            "centroids": self.centroids,
+            "assignments": self.assignments,
+        }
+
+    def restore(self, state):
+        self.nprobe = int(state["nprobe"])
+        self.centroids = state["centroids"]
+        self.nlist = int(state["nlist"])
+        self.assignments = np.empty(0, dtype=np.int64)
+        self._lists = [[] for _ in range(self.nlist)]
+        self._list_arrays = {}
+        for row, label in enumerate(state["assignments"]):
+            self._lists[label].append(row)
+        self.assignments = np.asarray(state["assignments"], dtype=np.int64)
+        self.trained_size = len(self.assignments)
+
+
+class LSHIndex:
+    # Random-hyperplane LSH: each table hashes an encoding to a bucket of
+    # `bits` sign bits, a query scans the union of its buckets
+    kind = "lsh"
+
+    def __init__(self, tables=8, bits=12, seed=0):
+        self.tables = tables
+        self.bits = bits
+        self.seed = seed
+        self.center = None
+        self.planes = None
+        self.codes = np.empty((0, tables), dtype=np.int64)
+        self.trained_size = 0  # rows the center was computed from
+        self._buckets = [{} for _ in range(tables)]
+
+    @property
+    def is_trained(self):
+        return self.planes is not None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def build(self, encodings):
+        encodings = np.asarray(encodings, dtype=np.float64)
+        if not len(encodings):
+            return
+        rng = np.random.default_rng(self.seed)
+        dim = encodings.shape[1]
+
+        # Encodings are not zero-centred, so centre them before hashing or
+        # most hyperplanes would put the whole roster on one side
+        self.center = encodings.mean(axis=0)
+        self.trained_size = len(encodings)
+        self.planes = rng.standard_normal((self.tables, dim, self.bits))
+        self.codes = np.empty((0, self.tables), dtype=np.int64)
+        self._buckets = [{} for _ in range(self.tables)]
+        self.add(encodings, 0)
+
+    def _hash(self, points):
+        centred = points - self.center
+        weights = 1 << np.arange(self.bits, dtype=np.int64)
+        signs = np.einsum("nd,tdb->ntb", centred, self.planes) > 0
+        return signs.astype(np.int64) @ weights
+
+    def add(self, encodings, start_row):
+        if not self.is_trained:
+            return
+        encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, self.planes.shape[1])
+        codes = self._hash(encodings)
+        for offset, row_codes in enumerate(codes):
+            for table, code in enumerate(row_codes):
+                self._buckets[table].setdefault(int(code), []).append(start_row + offset)
+        self.codes = np.concatenate([self.codes, codes])
+
+    def candidates(self, faces):
+        results = []
+        for row_codes in self._hash(faces):
+            rows = []
+            for table, code in enumerate(row_codes):
+                rows.extend(self._buckets[table].get(int(code), ()))
+            results.append(np.unique(np.asarray(rows, dtype=np.int64)))
+        return results
+
+    def state(self):
+        return {
+            "tables": np.int64(self.tables),
+            "bits": np.int64(self.bits),
+            "center": self.center,
+            "planes": self.planes,
+            "codes": self.codes,
+        }
+
+    def restore(self, state):
+        self.tables = int(state["tables"])
+        self.bits = int(state["bits"])
+        self.center = state["center"]
+        self.planes = state["planes"]
+        self.codes = np.asarray(state["codes"], dtype=np.int64)
+        self.trained_size = len(self.codes)
+        self._buckets = [{} for _ in range(self.tables)]
+        for row, row_codes in enumerate(self.codes):
+            for table, code in enumerate(row_codes):
+                self._buckets[table].setdefault(int(code), []).append(row)
+
+
+INDEX_TYPES = {IVFIndex.kind: IVFIndex, LSHIndex.kind: LSHIndex}
+
+
+def create_index(kind, **options):
+    try:
+        return INDEX_TYPES[kind](**options)
+    except KeyError:
+        raise ValueError(f"Unknown index type: {kind}")
+
+
+def save_index(index, path, ids):
+    # The student ids are stored alongside so a stale file is detected
+    # instead of silently pointing rows at the wrong students
+    state = index.state()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, kind=np.array(index.kind), ids=np.asarray(ids, dtype=np.int64), **state)
+    os.replace(tmp_path, path)
+
+
+def load_index(path, ids=None):
+    with np.load(path, allow_pickle=False) as data:
+        state = {key: data[key] for key in data.files}
+    if ids is not None and not np.array_equal(state["ids"], np.asarray(ids, dtype=np.int64)):
+        return None
+    index = create_index(str(state["kind"]))
+    index.restore(state)
+    return index
+
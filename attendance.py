@@ -0,0 +1,177 @@
+import json
+import queue
+import sys
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import metrics
+
+AttendanceEvent = namedtuple("AttendanceEvent", "kind student_id date timestamp")
+
+CHECK_IN = "Checked In"
+CHECK_OUT = "Checked Out"
+
+
+class AttendanceState:
+    # Who has checked in/out today, kept in memory so recognising the same
+    # student on every frame never needs a DB round trip. `loader(date)` is
+    # called once per day and returns (student_id, time_in, time_out) rows
+    def __init__(self, loader=None):
+        self.loader = loader
+        self.date = None
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def _roll_over(self, today):
+        if self.date == today:
+            return
+        self.date = today
+        self._records = {}
+        if self.loader is not None:
+            for student_id, time_in, time_out in self.loader(today):
+                self._records[student_id] = [time_in, time_out]
+
+    def status(self, student_id, today=None):
+        with self._lock:
+            self._roll_over(today or datetime.now().date())
+            record = self._records.get(student_id)
+        if record is None:
+            return None
+        return CHECK_OUT if record[1] else CHECK_IN
+
+    def record(self, student_id, now=None):
+        # Returns the event this sighting produced, or None if there is
+        # nothing new to write
+        now = now or datetime.now()
+        with self._lock:
+            self._roll_over(now.date())
+            record = self._records.get(student_id)
+            if record is None:
+                self._records[student_id] = [now, None]
+                return AttendanceEvent(CHECK_IN, student_id, now.date(), now)
+            if record[1] is None:
+                record[1] = now
+                return AttendanceEvent(CHECK_OUT, student_id, now.date(), now)
+            return None
+
+
+class AttendanceWriter(threading.Thread):
+    # Drains attendance events in batches: one executemany per event kind
+    # per flush, every flush_interval seconds or once max_batch is queued.
+    # on_error(e) hears about the first failed flush and then at most once
+    # every error_interval seconds while the database stays down;
+    # on_recover(failures) is called when a flush succeeds again. Events
+    # the final flush could not write are appended to unsent_path
+    def __init__(self, storage, flush_interval=1.0, max_batch=500, on_error=None, on_recover=None,
+                 error_interval=60.0, unsent_path=None):
+        super().__init__(daemon=True)
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.on_error = on_error
+        self.on_recover = on_recover
+        self.error_interval = error_interval
+        self.unsent_path = unsent_path
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0  # consecutive failed flushes
+        self.unsent = 0
+        self.last_error = None
+        self._last_report = None
+        self._queue = queue.Queue()
+        self._retry = []
+        self._stop_event = threading.Event()
+
+    def submit(self, event):
+        self._queue.put(event)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            deadline = time.monotonic() + self.flush_interval
+            batch = self._retry
+            self._retry = []
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop_event.is_set():
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if batch:
+                self.flush(batch)
+
+        # Final flush of whatever is still queued; nothing retries after
+        # this one, so a failed batch is saved instead
+        batch = self._retry + self._drain()
+        self._retry = []
+        if batch and not self.flush(batch):
+            self._spill(self._retry)
+            self._retry = []
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def flush(self, batch):
+        check_ins = [(e.student_id, e.date, e.timestamp, "Present") for e in batch if e.kind == CHECK_IN]
+        check_outs = [(e.timestamp, e.student_id, e.date) for e in batch if e.kind == CHECK_OUT]
+        start = time.perf_counter()
+        try:
+            self.storage.write_attendance(check_ins, check_outs)
+        except Exception as e:
+            # Keep the batch for the next flush rather than losing check-ins
+            self.last_error = e
+            self._retry = batch + self._retry
+            self._failed(e)
+            return False
+
+        metrics.DB_WRITE_SECONDS.observe(time.perf_counter() - start)
+        metrics.DB_EVENTS_WRITTEN.inc(len(batch))
+        self.written += len(batch)
+        self.flushes += 1
+        if self.failures:
+            failures, self.failures = self.failures, 0
+            self._last_report = None
+            if self.on_recover is not None:
+                self.on_recover(failures)
+        return True
+
+    def _failed(self, error):
+        self.failures += 1
+        now = time.monotonic()
+        if self._last_report is not None and now - self._last_report < self.error_interval:
+            return
+        self._last_report = now
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def _spill(self, batch):
+        lines = [json.dumps({
+            "kind": e.kind,
+            "student_id": e.student_id,
+            "date": e.date.isoformat(),
+            "timestamp": e.timestamp.isoformat(),
+        }) for e in batch]
+        self.unsent += len(batch)
+        if self.unsent_path is not None:
+            try:
+                with open(self.unsent_path, "a") as f:
+                    f.write("".join(line + "\n" for line in lines))
+                print(f"{len(batch)} unsent attendance events saved to {self.unsent_path}", file=sys.stderr)
+                return
+            except OSError as e:
+                print(f"could not save unsent attendance events: {e}", file=sys.stderr)
+        for line in lines:
+            print(f"unsent attendance event: {line}", file=sys.stderr)
+
+    def close(self, timeout=5.0):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
@@ -0,0 +1,110 @@
+import threading
+import tkinter as tk
+from collections import deque
+from datetime import date, datetime
+from tkinter import messagebox
+
+HISTORY_SQL = """
+    SELECT * FROM (
+        SELECT s.name AS name, a.time_in AS event_time, 'Checked In' AS status
+        FROM attendance a JOIN students s ON s.student_id = a.student_id
+        WHERE a.time_in < %s
+        UNION ALL
+        SELECT s.name AS name, a.time_out AS event_time, 'Checked Out' AS status
+        FROM attendance a JOIN students s ON s.student_id = a.student_id
+        WHERE a.time_out < %s
+    ) events
+    ORDER BY event_time DESC
+    LIMIT %s
+"""
+
+
+class AttendanceLog:
+    # Keeps the log Treeview at a fixed size. Events from any thread go into
+    # a ring buffer of the newest `capacity` rows and reach the widget in
+    # one batch per flush() tick. Older rows are paged in from the
+    # attendance table on request, `page_size` at a time
+    def __init__(self, tree, storage, capacity=200, page_size=100, post=None):
+        self.tree = tree
+        self.storage = storage
+        self.capacity = capacity
+        self.page_size = page_size
+        self.post = post or (lambda callback, *args: callback(*args))
+        self.recent = deque(maxlen=capacity)
+        self.live = True
+        self._pending = 0
+        self._cursor = None  # oldest event time shown while paging
+        self._lock = threading.Lock()
+
+    def append(self, name, status, timestamp=None):
+        with self._lock:
+            self.recent.append((name, timestamp or datetime.now(), status))
+            self._pending += 1
+
+    def flush(self):
+        # Called on the Tk thread; at most one insert batch and one scroll
+        with self._lock:
+            pending, self._pending = min(self._pending, self.capacity), 0
+            rows = list(self.recent)[len(self.recent) - pending:] if pending else []
+        if not rows or not self.live:
+            return
+
+        for name, timestamp, status in rows:
+            self.tree.insert("", tk.END, values=(name, self.format_time(timestamp), status))
+        children = self.tree.get_children()
+        if len(children) > self.capacity:
+            self.tree.delete(*children[:len(children) - self.capacity])
+        self.tree.yview_moveto(1)
+
+    def show_latest(self):
+        self.live = True
+        self._cursor = None
+        with self._lock:
+            rows = list(self.recent)
+            self._pending = 0
+        self._replace_rows(rows)
+        self.tree.yview_moveto(1)
+
+    def show_older(self):
+        # Fetches the page before the oldest row on screen off the Tk thread
+        if self._cursor is None:
+            with self._lock:
+                self._cursor = self.recent[0][1] if self.recent else datetime.now()
+        self.live = False
+        cursor = self._cursor
+        threading.Thread(target=self._fetch_page, args=(cursor,), daemon=True).start()
+
+    def _fetch_page(self, cursor):
+        try:
+            rows = self.storage.fetchall(HISTORY_SQL, (cursor, cursor, self.page_size))
+        except Exception as e:
+            self.post(self._page_failed, e)
+            return
+        self.post(self._show_page, cursor, [(row['name'], row['event_time'], row['status']) for row in rows])
+
+    def _show_page(self, cursor, rows):
+        if self.live or cursor != self._cursor or not rows:
+            return
+        # Newest at the bottom, like the live view
+        rows.reverse()
+        self._cursor = rows[0][1]
+        self._replace_rows(rows)
+        self.tree.yview_moveto(0)
+
+    def _page_failed(self, error):
+        messagebox.showerror("Database Error", f"Failed to load attendance history: {str(error)}")
+
+    def _replace_rows(self, rows):
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        for name, timestamp, status in rows:
+            self.tree.insert("", tk.END, values=(name, self.format_time(timestamp), status))
+
+    @staticmethod
+    def format_time(timestamp):
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        if timestamp.date() == date.today():
+            return timestamp.strftime("%H:%M:%S")
+        return timestamp.strftime("%Y-%m-%d %H:%M")
@@ -0,0 +1,463 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+import numpy as np
+
+from ann_index import create_index
+from attendance import AttendanceState
+from gallery import FaceGallery
+from tracking import match_boxes
+
+
+def synthetic_gallery(size, dim=128, seed=0):
+    # Identity centres roughly 1.0 apart and probes roughly 0.35 from their
+    # enrolled encoding, close to what dlib's encoder produces
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(0.0, 0.07, size=(size, dim))
+    enrolled = centres + rng.normal(0.0, 0.022, size=(size, dim))
+    return centres, enrolled
+
+
+def synthetic_probes(centres, count, seed=1):
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(len(centres), size=count, replace=count > len(centres))
+    probes = centres[ids] + rng.normal(0.0, 0.022, size=(count, centres.shape[1]))
+    return ids, probes
+
+
+def time_matches(gallery, probes, exact, repeats, batch):
+    # Probes are matched a frame's worth at a time, as process_faces does
+    best = None
+    for _ in range(repeats):
+        results = []
+        start = time.perf_counter()
+        for offset in range(0, len(probes), batch):
+            results.extend(gallery.match(probes[offset:offset + batch], k=1, exact=exact))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    rows = [matches[0][0]['row'] if matches else -1 for matches in results]
+    return np.asarray(rows), best
+
+
+def ann_report(sizes, probes_count, repeats, batch, configs):
+    report = []
+    for size in sizes:
+        centres, enrolled = synthetic_gallery(size)
+        _, probes = synthetic_probes(centres, probes_count)
+
+        gallery = FaceGallery(capacity=size)
+        gallery.add_many(enrolled, [{'student_id': row, 'row': row} for row in range(size)])
+        exact_rows, exact_time = time_matches(gallery, probes, True, repeats, batch)
+        report.append({
+            "gallery": size,
+            "method": "exact",
+            "params": {},
+            "recall_at_1": 1.0,
+            "ms_per_query": 1000.0 * exact_time / probes_count,
+            "speedup": 1.0,
+        })
+
+        for kind, options in configs:
+            index = create_index(kind, **options)
+            start = time.perf_counter()
+            gallery.set_index(index)
+            build_time = time.perf_counter() - start
+
+            rows, elapsed = time_matches(gallery, probes, False, repeats, batch)
+            report.append({
+                "gallery": size,
+                "method": kind,
+                "params": options,
+                "recall_at_1": float(np.mean(rows == exact_rows)),
+                "ms_per_query": 1000.0 * elapsed / probes_count,
+                "speedup": exact_time / elapsed if elapsed else float("inf"),
+                "build_s": build_time,
+            })
+        gallery.set_index(None)
+    return report
+
+
+def precision_report(sizes, probes_count, repeats, batch, precisions):
+    # Recall is measured against the float64 gallery
+    report = []
+    for size in sizes:
+        centres, enrolled = synthetic_gallery(size)
+        _, probes = synthetic_probes(centres, probes_count)
+        students = [{'student_id': row, 'row': row} for row in range(size)]
+
+        reference_rows = None
+        for precision in ["float64"] + [p for p in precisions if p != "float64"]:
+            gallery = FaceGallery(capacity=size, precision=precision)
+            gallery.add_many(enrolled, students)
+            rows, elapsed = time_matches(gallery, probes, True, repeats, batch)
+            if reference_rows is None:
+                reference_rows, reference_bytes = rows, gallery.nbytes
+            report.append({
+                "gallery": size,
+                "precision": precision,
+                "recall_at_1": float(np.mean(rows == reference_rows)),
+                "ms_per_query": 1000.0 * elapsed / probes_count,
+                "bytes_per_face": gallery.nbytes / size,
+                "memory_ratio": reference_bytes / gallery.nbytes,
+            })
+    return report
+
+
+def read_images(directory):
+    import cv2
+    from recording import EXTENSION, read_recording
+
+    # A frame recording stands in for a directory of stored frames
+    if directory.endswith(EXTENSION):
+        return [frame for _, frame in read_recording(directory)]
+    frames = []
+    for name in sorted(os.listdir(directory)):
+        image = cv2.imread(os.path.join(directory, name))
+        if image is not None:
+            frames.append(image)
+    return frames
+
+
+def load_frames(directory, size=(640, 480)):
+    import cv2
+
+    # Frames are resized the same way update_video prepares them
+    return [cv2.resize(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), size) for image in read_images(directory)]
+
+
+def scale_report(frames, scales, repeats, model, upsample):
+    import face_recognition
+    from detection import detect_faces
+
+    # Full-resolution detection is the reference every scale is scored against
+    reference = []
+    for frame in frames:
+        face_locations = detect_faces(frame, 1.0, model, upsample)
+        reference.append((face_locations, face_recognition.face_encodings(frame, face_locations)))
+
+    report = []
+    for scale in scales:
+        detect_times, encode_times = [], []
+        found_total = reference_total = matched_total = 0
+        drift = []
+        for frame, (ref_locations, ref_encodings) in zip(frames, reference):
+            for _ in range(repeats):
+                start = time.perf_counter()
+                face_locations = detect_faces(frame, scale, model, upsample)
+                detect_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                face_encodings = face_recognition.face_encodings(frame, face_locations)
+                encode_times.append(time.perf_counter() - start)
+
+            pairs = match_boxes(face_locations, ref_locations)
+            found_total += len(face_locations)
+            reference_total += len(ref_locations)
+            matched_total += len(pairs)
+            drift.extend(float(np.linalg.norm(face_encodings[i] - ref_encodings[j])) for i, j in pairs)
+
+        report.append({
+            "scale": scale,
+            "detect_ms": 1000.0 * float(np.median(detect_times)),
+            "encode_ms": 1000.0 * float(np.median(encode_times)),
+            "recall": matched_total / reference_total if reference_total else 1.0,
+            "precision": matched_total / found_total if found_total else 1.0,
+            "encoding_drift": float(np.mean(drift)) if drift else 0.0,
+        })
+    return report
+
+
+def summarize(samples):
+    if not samples:
+        return {"n": 0}
+    ms = 1000.0 * np.asarray(samples)
+    return {
+        "n": int(len(ms)),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def timed(samples, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    samples.append(time.perf_counter() - start)
+    return result
+
+
+def revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def photo_image_factory(size):
+    # Times the app's display path (one persistent PhotoImage per tile).
+    # PhotoImage needs a Tk interpreter; CI machines without a display skip it
+    try:
+        import tkinter as tk
+        from display import TileRenderer
+
+        root = tk.Tk()
+        root.withdraw()
+        renderer = TileRenderer(tk.Label(root), tuple(size))
+    except Exception:
+        return None, None
+    return root, renderer.render
+
+
+def pipeline_report(frames, sizes, repeats, scale, display_size, seed=0):
+    import cv2
+
+    try:
+        import face_recognition
+        from detection import detect_faces
+    except ImportError:
+        face_recognition = None
+
+    stages = {name: [] for name in ("cvtColor", "resize", "face_locations", "face_encodings",
+                                    "attendance", "photoimage")}
+    root, make_photo = photo_image_factory(display_size)
+    attendance_state = AttendanceState()
+    rng = np.random.default_rng(seed)
+    faces_seen = []
+
+    for _ in range(repeats):
+        for frame in frames:
+            frame_rgb = timed(stages["cvtColor"], cv2.cvtColor, frame, cv2.COLOR_BGR2RGB)
+            frame_rgb = timed(stages["resize"], cv2.resize, frame_rgb, display_size)
+
+            face_count = 0
+            if face_recognition is not None:
+                face_locations = timed(stages["face_locations"], detect_faces, frame_rgb, scale)
+                timed(stages["face_encodings"], face_recognition.face_encodings, frame_rgb, face_locations)
+                face_count = len(face_locations)
+            faces_seen.append(face_count)
+
+            # In-memory check-in bookkeeping for each face in the frame
+            student_ids = rng.integers(0, 1000, size=max(face_count, 1))
+            timed(stages["attendance"], lambda: [attendance_state.record(int(i)) for i in student_ids])
+
+            if make_photo is not None:
+                timed(stages["photoimage"], make_photo, frame_rgb)
+
+    if root is not None:
+        root.destroy()
+
+    # Matching is timed per frame against synthetic galleries of each size
+    faces_per_frame = max(1, int(round(np.mean(faces_seen)))) if faces_seen else 1
+    matching = {}
+    for size in sizes:
+        centres, enrolled = synthetic_gallery(size, seed=seed)
+        gallery = FaceGallery(capacity=size)
+        gallery.add_many(enrolled, [{'student_id': row} for row in range(size)])
+        _, probes = synthetic_probes(centres, faces_per_frame * len(frames) * repeats, seed=seed + 1)
+        samples = []
+        for offset in range(0, len(probes), faces_per_frame):
+            timed(samples, gallery.match, probes[offset:offset + faces_per_frame], 1)
+        matching[str(size)] = summarize(samples)
+
+    skipped = []
+    if face_recognition is None:
+        skipped += ["face_locations", "face_encodings"]
+    if make_photo is None:
+        skipped.append("photoimage")
+
+    return {
+        "meta": {
+            "revision": revision(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "frames": len(frames),
+            "frame_shape": list(frames[0].shape) if frames else None,
+            "repeats": repeats,
+            "detection_scale": scale,
+            "faces_per_frame": faces_per_frame,
+            "skipped": skipped,
+        },
+        "stages": {name: summarize(samples) for name, samples in stages.items() if name not in skipped},
+        "matching": matching,
+    }
+
+
+def print_table(report, columns):
+    widths = [max(len(column), *(len(format_cell(row.get(column))) for row in report)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in report:
+        print("  ".join(format_cell(row.get(column)).ljust(width) for column, width in zip(columns, widths)))
+
+
+def format_cell(value):
+    if isinstance(value, float):
+        return f"{value:.4f}"
+    if isinstance(value, dict):
+        return ",".join(f"{key}={val}" for key, val in value.items())
+    return "" if value is None else str(value)
+
+
+def run_ann(args):
+    configs = [("ivf", {"nprobe": nprobe}) for nprobe in args.nprobe]
+    configs += [("lsh", {"tables": tables, "bits": args.bits}) for tables in args.tables]
+    report = ann_report(args.sizes, args.probes, args.repeats, args.batch, configs)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(report, ["gallery", "method", "params", "recall_at_1", "ms_per_query", "speedup", "build_s"])
+
+
+def run_precision(args):
+    report = precision_report(args.sizes, args.probes, args.repeats, args.batch, args.precisions)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(report, ["gallery", "precision", "recall_at_1", "ms_per_query", "bytes_per_face", "memory_ratio"])
+
+
+def run_scales(args):
+    frames = load_frames(args.frames)
+    if not frames:
+        raise SystemExit(f"No readable images in {args.frames}")
+    report = scale_report(frames, args.scales, args.repeats, args.model, args.upsample)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(report, ["scale", "detect_ms", "encode_ms", "recall", "precision", "encoding_drift"])
+
+
+def run_detectors(args):
+    from detectors import available_detectors, calibrate
+
+    frames = load_frames(args.frames)
+    if not frames:
+        raise SystemExit(f"No readable images in {args.frames}")
+    detectors = available_detectors(args.detectors)
+    if not detectors:
+        raise SystemExit("None of the requested detectors could be loaded")
+    chosen, report = calibrate(detectors, frames, args.scale, args.accuracy_floor)
+    if args.json:
+        print(json.dumps({"chosen": chosen, "detectors": report}, indent=2))
+    else:
+        print_table(report, ["detector", "detect_ms", "recall", "precision", "f1"])
+        print(f"\nchosen: {chosen}")
+
+
+def run_pipeline(args):
+    if args.frames:
+        frames = read_images(args.frames)
+        if not frames:
+            raise SystemExit(f"No readable images in {args.frames}")
+    else:
+        # Without stored frames, noise frames still time everything but
+        # detection finds no faces
+        rng = np.random.default_rng(args.seed)
+        width, height = args.frame_size
+        frames = [rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8) for _ in range(args.count)]
+
+    report = pipeline_report(frames, args.sizes, args.repeats, args.scale, tuple(args.display_size), args.seed)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+def run_compare(args):
+    # Side-by-side p50/p95 of two pipeline reports, e.g. two revisions
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows = []
+    for section in ("stages", "matching"):
+        for name, stats in candidate.get(section, {}).items():
+            before = baseline.get(section, {}).get(name)
+            if not before or not stats.get("n") or not before.get("n"):
+                continue
+            row = {"stage": name if section == "stages" else f"match@{name}"}
+            for key in ("p50_ms", "p95_ms"):
+                row[f"{key}_before"] = before[key]
+                row[f"{key}_after"] = stats[key]
+            row["p50_change"] = stats["p50_ms"] / before["p50_ms"] - 1.0 if before["p50_ms"] else 0.0
+            rows.append(row)
+    print_table(rows, ["stage", "p50_ms_before", "p50_ms_after", "p95_ms_before", "p95_ms_after", "p50_change"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline CPU benchmarks for the recognition pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ann = subparsers.add_parser("ann", help="Recall versus latency of the ANN indexes against exact search")
+    ann.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    ann.add_argument("--probes", type=int, default=200)
+    ann.add_argument("--repeats", type=int, default=3)
+    ann.add_argument("--batch", type=int, default=4, help="Faces matched per call, i.e. faces per frame")
+    ann.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16])
+    ann.add_argument("--tables", type=int, nargs="+", default=[4, 8, 16])
+    ann.add_argument("--bits", type=int, default=12)
+    ann.add_argument("--json", action="store_true")
+    ann.set_defaults(func=run_ann)
+
+    precision = subparsers.add_parser("precision", help="Recall, latency and memory of compact gallery encodings")
+    precision.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    precision.add_argument("--probes", type=int, default=200)
+    precision.add_argument("--repeats", type=int, default=3)
+    precision.add_argument("--batch", type=int, default=4, help="Faces matched per call, i.e. faces per frame")
+    precision.add_argument("--precisions", nargs="+", default=["float16", "int8"])
+    precision.add_argument("--json", action="store_true")
+    precision.set_defaults(func=run_precision)
+
+    scales = subparsers.add_parser("scales", help="Detection accuracy and latency per detection scale")
+    scales.add_argument("frames", help="Directory of stored frames")
+    scales.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.75, 0.5, 0.25])
+    scales.add_argument("--repeats", type=int, default=3)
+    scales.add_argument("--model", default="hog")
+    scales.add_argument("--upsample", type=int, default=1)
+    scales.add_argument("--json", action="store_true")
+    scales.set_defaults(func=run_scales)
+
+    detectors = subparsers.add_parser("detectors", help="Latency and accuracy of each detector backend")
+    detectors.add_argument("frames", help="Directory of stored frames")
+    detectors.add_argument("--detectors", nargs="+", help="Backends to compare (default: every one that loads)")
+    detectors.add_argument("--scale", type=float, default=0.5, help="Detection scale")
+    detectors.add_argument("--accuracy-floor", type=float, default=0.8)
+    detectors.add_argument("--json", action="store_true")
+    detectors.set_defaults(func=run_detectors)
+
+    pipeline = subparsers.add_parser("pipeline", help="Per-stage latency of the recognition pipeline as JSON")
+    pipeline.add_argument("--frames", help="Directory of stored camera frames to replay")
+    pipeline.add_argument("--count", type=int, default=50, help="Synthetic frames when --frames is not given")
+    pipeline.add_argument("--frame-size", type=int, nargs=2, default=[1280, 720], metavar=("WIDTH", "HEIGHT"))
+    pipeline.add_argument("--display-size", type=int, nargs=2, default=[640, 480], metavar=("WIDTH", "HEIGHT"))
+    pipeline.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    pipeline.add_argument("--repeats", type=int, default=3)
+    pipeline.add_argument("--scale", type=float, default=0.5, help="Detection scale")
+    pipeline.add_argument("--seed", type=int, default=0)
+    pipeline.add_argument("--output", help="Write the JSON report here instead of stdout")
+    pipeline.set_defaults(func=run_pipeline)
+
+    compare = subparsers.add_parser("compare", help="Compare two pipeline reports")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.set_defaults(func=run_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
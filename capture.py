@@ -0,0 +1,311 @@
+import threading
+import time
+from collections import namedtuple
+
+import metrics
+
+# source is the VideoSource a captured frame came from, if any
+FramePacket = namedtuple("FramePacket", "seq timestamp value source", defaults=(None,))
+
+
+class FrameSlot:
+    # Single-entry buffer: writers overwrite, readers only ever see the
+    # newest item, so a slow consumer never builds up a backlog
+    def __init__(self, source=None):
+        self._cond = threading.Condition()
+        self._packet = None
+        self._taken = True
+        self._closed = False
+        self._listeners = []
+        self.source = source
+        self.dropped = 0
+
+    def subscribe(self, callback):
+        # callback() runs after every put and on close, outside the slot's
+        # lock, so it may take locks of its own
+        self._listeners.append(callback)
+
+    def put(self, value, timestamp=None):
+        with self._cond:
+            if not self._taken:
+                self.dropped += 1
+            seq = self._packet.seq + 1 if self._packet else 1
+            packet = self._packet = FramePacket(seq, time.monotonic() if timestamp is None else timestamp, value,
+                                                self.source)
+            self._taken = False
+            self._cond.notify_all()
+        for callback in self._listeners:
+            callback()
+        return packet
+
+    def latest(self):
+        return self._packet
+
+    def wait(self, after_seq=0, timeout=None):
+        # Block until something newer than after_seq arrives; returns None on
+        # timeout or once the slot is closed
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._closed and (self._packet is None or self._packet.seq <= after_seq):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self._closed:
+                return None
+            self._taken = True
+            return self._packet
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for callback in self._listeners:
+            callback()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class CaptureThread(threading.Thread):
+    def __init__(self, video_capture, slot, transform=None, retry_delay=0.01, source="camera"):
+        super().__init__(daemon=True)
+        self.video_capture = video_capture
+        self.slot = slot
+        self.transform = transform
+        self.retry_delay = retry_delay
+        self.frames = 0
+        self.failures = 0
+        self._captured = metrics.FRAMES_CAPTURED.labels(source)
+        self._dropped = metrics.FRAMES_DROPPED.labels(source)
+        self._read_seconds = metrics.STAGE_SECONDS.labels("capture")
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            start = time.perf_counter()
+            ret, frame = self.video_capture.read()
+            timestamp = time.monotonic()
+            if not ret:
+                self.failures += 1
+                time.sleep(self.retry_delay)
+                continue
+
+            if self.transform is not None:
+                frame = self.transform(frame)
+            self._read_seconds.observe(time.perf_counter() - start)
+
+            dropped = self.slot.dropped
+            self.slot.put(frame, timestamp)
+            if self.slot.dropped != dropped:
+                self._dropped.inc()
+            self._captured.inc()
+            self.frames += 1
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+
+class VideoFileCapture:
+    # A video file standing in for a camera. cv2.VideoCapture alone hands
+    # out frames as fast as they decode (so the slot drops most of them)
+    # and fails every read after the end; this releases them at the file's
+    # own frame rate and, with `loop`, starts over at the end
+    def __init__(self, path, realtime=True, loop=True, default_fps=30.0):
+        import cv2
+
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.frames = 0
+        self._position = 0
+        self._start = None
+        self.video_capture = cv2.VideoCapture(path)
+        fps = self.video_capture.get(cv2.CAP_PROP_FPS) if self.video_capture.isOpened() else 0
+        self.interval = 1.0 / (fps if fps and fps > 0 else default_fps)
+
+    def isOpened(self):
+        return self.video_capture.isOpened()
+
+    def read(self):
+        import cv2
+
+        ret, frame = self.video_capture.read()
+        if not ret and self.loop and self._position:
+            # Reopening is the one restart every container supports
+            self.video_capture.release()
+            self.video_capture = cv2.VideoCapture(self.path)
+            self._position = 0
+            self._start = None
+            ret, frame = self.video_capture.read()
+        if not ret:
+            return False, None
+
+        if self.realtime:
+            now = time.monotonic()
+            offset = self._position * self.interval
+            if self._start is None:
+                self._start = now - offset
+            delay = self._start + offset - now
+            if delay > 0:
+                time.sleep(delay)
+        self._position += 1
+        self.frames += 1
+        return True, frame
+
+    def release(self):
+        self.video_capture.release()
+
+
+class VideoSource:
+    # One camera or video file: its capture thread, newest frame and newest
+    # recognition result. `state` is free for per-source recognition state
+    # such as a face tracker
+    def __init__(self, name, video_capture, transform=None, state=None):
+        self.name = name
+        self.video_capture = video_capture
+        self.frame_slot = FrameSlot(self)
+        self.result_slot = FrameSlot()
+        self.capture_thread = CaptureThread(video_capture, self.frame_slot, transform, source=name)
+        self.state = state
+        self.last_shown_seq = 0
+
+    def start(self):
+        self.capture_thread.start()
+
+    def stop(self):
+        self.frame_slot.close()
+        self.capture_thread.stop()
+        self.video_capture.release()
+
+
+class FairScheduler:
+    # Round-robin over several frame slots, taking at most one frame per
+    # source per turn, so a busy camera can not starve the others of
+    # recognition. Looks like a FrameSlot to the recognition workers. Every
+    # slot notifies one shared condition, so an idle scheduler sleeps
+    # until a frame arrives instead of polling
+    def __init__(self, slots):
+        self.slots = list(slots)
+        self.served = [0] * len(self.slots)
+        self._last_seq = [0] * len(self.slots)
+        self._next = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        for slot in self.slots:
+            slot.subscribe(self._notify)
+
+    def _notify(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait(self, after_seq=0, timeout=None):
+        # after_seq is tracked per slot here, so the argument is ignored.
+        # Holding the condition from the scan to wait() means a put in
+        # between is never missed: its notify waits for the lock
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self.closed:
+                for offset in range(len(self.slots)):
+                    i = (self._next + offset) % len(self.slots)
+                    packet = self.slots[i].wait(self._last_seq[i], timeout=0)
+                    if packet is not None:
+                        self._last_seq[i] = packet.seq
+                        self._next = i + 1
+                        self.served[i] += 1
+                        return packet
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+        return None
+
+    def latest(self):
+        return None
+
+    def close(self):
+        self._closed = True
+        self._notify()
+
+    @property
+    def closed(self):
+        return self._closed or all(slot.closed for slot in self.slots)
+
+
+def slot_for_result(worker, packet):
+    # Results of a VideoSource frame go back to that source
+    return worker.result_slot if packet.source is None else packet.source.result_slot
+
+
+class RecognitionWorker(threading.Thread):
+    # Runs `process` on the newest captured frame and publishes the result;
+    # frames that arrive while it is busy are skipped, not queued. Frames
+    # from a VideoSource are processed as process(frame, source) and their
+    # results go to that source's result slot. An optional `pacer`
+    # (pacing.AdaptiveScheduler) spaces frames out to its target rate.
+    # Frames an optional `gate(packet)` rejects are skipped before any
+    # work, leaving the last result in place. A frame whose processing
+    # raises is counted and passed to `on_error(e)` on this thread
+    def __init__(self, frame_slot, process, result_slot=None, poll_interval=0.1, pacer=None, gate=None,
+                 on_error=None):
+        super().__init__(daemon=True)
+        self.frame_slot = frame_slot
+        self.process = process
+        self.result_slot = result_slot or FrameSlot()
+        self.poll_interval = poll_interval
+        self.pacer = pacer
+        self.gate = gate
+        self.on_error = on_error
+        self.processed = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_latency = 0.0
+        self._errors = metrics.RECOGNITION_ERRORS.labels("recognize")
+        self._stop_event = threading.Event()
+
+    def run(self):
+        last_seq = 0
+        while not self._stop_event.is_set():
+            if self.pacer is not None and self._stop_event.wait(self.pacer.recognition_wait()):
+                break
+            packet = self.frame_slot.wait(last_seq, timeout=self.poll_interval)
+            if packet is None:
+                if self.frame_slot.closed:
+                    break
+                continue
+            last_seq = packet.seq
+            if self.gate is not None and not self.gate(packet):
+                continue
+
+            start = time.perf_counter()
+            try:
+                if packet.source is None:
+                    result = self.process(packet.value)
+                else:
+                    result = self.process(packet.value, packet.source)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+                self._errors.inc()
+                if self.on_error is not None:
+                    self.on_error(e)
+                continue
+            cost = time.perf_counter() - start
+            metrics.STAGE_SECONDS.labels("recognize").observe(cost)
+            if self.pacer is not None:
+                self.pacer.record_recognition(cost)
+
+            # Results carry the capture timestamp of the frame they describe
+            slot_for_result(self, packet).put(result, packet.timestamp)
+            self.last_latency = time.monotonic() - packet.timestamp
+            metrics.FRAME_LATENCY.observe(self.last_latency)
+            self.processed += 1
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
@@ -0,0 +1,51 @@
+def scale_locations(face_locations, scale, shape):
+    # Map (top, right, bottom, left) boxes found on a downscaled frame back
+    # onto the full-resolution frame, clipped to its bounds
+    height, width = shape[:2]
+    mapped = []
+    for top, right, bottom, left in face_locations:
+        mapped.append((
+            max(0, int(round(top / scale))),
+            min(width, int(round(right / scale))),
+            min(height, int(round(bottom / scale))),
+            max(0, int(round(left / scale))),
+        ))
+    return mapped
+
+
+_detectors = {}
+
+
+def get_detector(detector=None, model="hog", upsample=1):
+    # Accepts a detector, a backend name from detectors.DETECTOR_TYPES or
+    # None for face_recognition's own. Named backends are loaded once per
+    # process, which also keeps the pool's workers from reloading models
+    from detectors import HOGDetector, create_detector
+
+    if detector is None:
+        return HOGDetector(upsample, model)
+    if isinstance(detector, str):
+        if detector not in _detectors:
+            _detectors[detector] = create_detector(detector)
+        return _detectors[detector]
+    return detector
+
+
+def detect_faces(frame, scale=1.0, model="hog", upsample=1, detector=None):
+    import cv2
+
+    detector = get_detector(detector, model, upsample)
+    # Detection cost grows with pixel count, so run it on a smaller copy
+    if scale != 1.0:
+        small = cv2.resize(frame, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return scale_locations(detector.detect(small), scale, frame.shape)
+    return detector.detect(frame)
+
+
+def detect_and_encode(frame, scale=1.0, model="hog", upsample=1, detector=None):
+    import face_recognition
+
+    # Encodings always come from the full-resolution frame
+    face_locations = detect_faces(frame, scale, model, upsample, detector)
+    face_encodings = face_recognition.face_encodings(frame, face_locations)
+    return face_locations, face_encodings
@@ -0,0 +1,162 @@
+import os
+import time
+
+import numpy as np
+
+from tracking import match_boxes
+
+# OpenCV's res10 SSD face detector; download both files into models/
+DNN_CONFIG = os.path.join("models", "deploy.prototxt")
+DNN_WEIGHTS = os.path.join("models", "res10_300x300_ssd_iter_140000.caffemodel")
+# The network was trained on BGR images with these per-channel means
+DNN_MEAN = (104.0, 177.0, 123.0)
+
+
+class HOGDetector:
+    # dlib's HOG + linear SVM through face_recognition. The most accurate
+    # of the CPU backends here and the reference the others are scored on
+    kind = "hog"
+
+    def __init__(self, upsample=1, model="hog"):
+        import face_recognition
+
+        self._locate = face_recognition.face_locations
+        self.upsample = upsample
+        self.model = model
+
+    def detect(self, frame):
+        return self._locate(frame, number_of_times_to_upsample=self.upsample, model=self.model)
+
+
+class HaarDetector:
+    # OpenCV Viola-Jones cascade on the grayscale frame: much cheaper than
+    # HOG, frontal faces only, more false positives
+    kind = "haar"
+
+    def __init__(self, cascade_path=None, scale_factor=1.1, min_neighbors=5, min_size=24):
+        import cv2
+
+        # OpenCV 5 moved the cascades out of the main package
+        if not hasattr(cv2, "CascadeClassifier"):
+            raise ImportError("This OpenCV build has no Haar cascade support")
+        if cascade_path is None:
+            cascade_path = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self._cascade = cv2.CascadeClassifier(cascade_path)
+        if self._cascade.empty():
+            raise OSError(f"Could not load Haar cascade {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, frame):
+        import cv2
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        boxes = self._cascade.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                               minSize=(self.min_size, self.min_size))
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in boxes]
+
+
+class DNNDetector:
+    # Small SSD network run by cv2.dnn from local model files. Cost is
+    # fixed by input_size rather than the frame size
+    kind = "dnn"
+
+    def __init__(self, config_path=DNN_CONFIG, weights_path=DNN_WEIGHTS, confidence=0.5, input_size=300):
+        import cv2
+
+        for path in (config_path, weights_path):
+            if not os.path.exists(path):
+                raise OSError(f"DNN face model file not found: {path}")
+        self._net = cv2.dnn.readNetFromCaffe(config_path, weights_path)
+        self.confidence = confidence
+        self.input_size = input_size
+
+    def detect(self, frame):
+        height, width = frame.shape[:2]
+        self._net.setInput(dnn_blob(frame, self.input_size))
+        output = self._net.forward()[0, 0]
+
+        boxes = []
+        for detection in output[output[:, 2] >= self.confidence]:
+            left, top, right, bottom = detection[3:7] * (width, height, width, height)
+            left, top = max(0, int(left)), max(0, int(top))
+            right, bottom = min(width, int(right)), min(height, int(bottom))
+            if right > left and bottom > top:
+                boxes.append((top, right, bottom, left))
+        return boxes
+
+
+def dnn_blob(frame, input_size=300):
+    # RGB frame -> the SSD's input. blobFromImage swaps to BGR first and
+    # subtracts the mean afterwards, so the mean stays in BGR order
+    import cv2
+
+    return cv2.dnn.blobFromImage(frame, 1.0, (input_size, input_size), DNN_MEAN, swapRB=True)
+
+
+DETECTOR_TYPES = {HOGDetector.kind: HOGDetector, HaarDetector.kind: HaarDetector, DNNDetector.kind: DNNDetector}
+
+
+def create_detector(kind, **options):
+    try:
+        detector_type = DETECTOR_TYPES[kind]
+    except KeyError:
+        raise ValueError(f"Unknown detector: {kind}")
+    return detector_type(**options)
+
+
+def available_detectors(kinds=None, options=None):
+    # Every backend that loads here (missing model files or modules are
+    # skipped); `options` maps a kind to its constructor arguments
+    options = options or {}
+    detectors = {}
+    for kind in kinds or DETECTOR_TYPES:
+        try:
+            detectors[kind] = create_detector(kind, **options.get(kind, {}))
+        except (ImportError, OSError):
+            continue
+    return detectors
+
+
+def calibrate(detectors, frames, scale=1.0, accuracy_floor=0.8, reference=HOGDetector.kind, min_iou=0.5):
+    # Times each backend on the sample frames exactly as recognition runs
+    # it (same resolution and detection scale) and scores it against the
+    # reference backend's boxes. Returns (chosen kind, report): the fastest
+    # backend whose F1 reaches accuracy_floor. Frames where the reference
+    # sees nobody can not tell the backends apart, so without any faces
+    # the reference is kept
+    from detection import detect_faces
+
+    if not detectors:
+        raise ValueError("No detector backend could be loaded")
+    if reference not in detectors:
+        reference = next(iter(detectors))
+    reference_boxes = None
+
+    report = []
+    for kind in [reference] + [kind for kind in detectors if kind != reference]:
+        detector = detectors[kind]
+        seconds, boxes = [], []
+        for frame in frames:
+            start = time.perf_counter()
+            boxes.append(detect_faces(frame, scale, detector=detector))
+            seconds.append(time.perf_counter() - start)
+        if reference_boxes is None:
+            reference_boxes = boxes
+
+        found = sum(len(frame_boxes) for frame_boxes in boxes)
+        expected = sum(len(frame_boxes) for frame_boxes in reference_boxes)
+        matched = sum(len(match_boxes(frame_boxes, ref, min_iou)) for frame_boxes, ref in zip(boxes, reference_boxes))
+        report.append({
+            "detector": kind,
+            "detect_ms": 1000.0 * float(np.median(seconds)) if seconds else 0.0,
+            "recall": matched / expected if expected else None,
+            "precision": matched / found if found else None,
+            "f1": 2.0 * matched / (found + expected) if expected else None,
+        })
+
+    if not any(row["f1"] for row in report):
+        return reference, report
+    eligible = [row for row in report if row["f1"] is not None and row["f1"] >= accuracy_floor]
+    return min(eligible, key=lambda row: row["detect_ms"])["detector"], report
@@ -0,0 +1,49 @@
+import numpy as np
+from PIL import Image, ImageTk
+
+
+class FramePreparer:
+    # Capture-thread transform: BGR camera frame -> RGB frame at `size`.
+    # Resizing first into a private buffer means only the smaller frame is
+    # colour converted, and the one array allocated per frame is the one
+    # that gets published. Use one instance per capture thread
+    def __init__(self, size=(640, 480)):
+        self.size = size
+        self._resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+
+    def __call__(self, frame):
+        import cv2
+
+        if (frame.shape[1], frame.shape[0]) == self.size:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        cv2.resize(frame, self.size, dst=self._resized, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB)
+
+
+class TileRenderer:
+    # Draws into one preallocated RGB buffer, refills one persistent PIL
+    # image from it in place and pastes that into one persistent
+    # PhotoImage, so steady-state rendering allocates no Python objects of
+    # frame size and Tk never has to create (or leak) a new photo
+    def __init__(self, label, size):
+        self.label = label
+        self.size = size
+        self.buffer = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        self._image = Image.new("RGB", size)
+        self.photo = ImageTk.PhotoImage("RGB", size)
+        label.imgtk = self.photo
+        label.configure(image=self.photo)
+
+    def render(self, frame, detections=None, draw=None):
+        # `draw(buffer, detections, scale)` paints overlays; boxes are in
+        # frame coordinates, scale maps them onto the tile
+        if (frame.shape[1], frame.shape[0]) == self.size:
+            np.copyto(self.buffer, frame)
+        else:
+            import cv2
+
+            cv2.resize(frame, self.size, dst=self.buffer, interpolation=cv2.INTER_AREA)
+        if draw is not None and detections:
+            draw(self.buffer, detections, self.size[0] / frame.shape[1])
+        self._image.frombytes(self.buffer)
+        self.photo.paste(self._image)
@@ -0,0 +1,141 @@
+import hashlib
+import io
+import os
+import tempfile
+
+import numpy as np
+
+# Bump when the stored format or the encoder itself changes
+CACHE_VERSION = 1
+
+
+class EncodingCache:
+    # Face encodings on disk, one .npy per image keyed by the sha256 of the
+    # image bytes and the encoder settings, so a renamed or re-imported
+    # photo is still a hit. Least recently used entries go first once the
+    # directory grows past max_bytes. The size is kept as a running total,
+    # so the directory is only rescanned when a put pushes it over
+    def __init__(self, directory="encoding_cache", max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._total = None
+
+    @property
+    def total_bytes(self):
+        if self._total is None:
+            self._total = sum(size for _, size, _ in self._entries())
+        return self._total
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npy"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # evicted by another process
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    @staticmethod
+    def key(image_bytes, model="hog", upsample=1, jitters=1):
+        digest = hashlib.sha256(image_bytes)
+        digest.update(f"|v{CACHE_VERSION}|{model}|{upsample}|{jitters}".encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            encodings = np.load(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return encodings
+
+    def put(self, key, encodings):
+        encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, 128)
+        # Written under a temporary name so concurrent pool workers never
+        # read a half-written entry
+        total = self.total_bytes
+        path = self._path(key)
+        try:
+            total -= os.path.getsize(path)  # overwriting an entry
+        except OSError:
+            pass
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, encodings)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._total = total + size
+        if self._total > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        # Rescans the directory, since other processes share it
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        self._total = total
+        if total <= self.max_bytes:
+            return 0
+
+        # Trim to 90% so eviction does not run on every insert
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._total = total
+        return removed
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npy"):
+                os.remove(entry.path)
+        self._total = 0
+
+
+def cached_face_encodings(image_path, cache=None, model="hog", upsample=1, jitters=1):
+    # Encodings of every face in the image, as an (n, 128) array. The file
+    # is read once: the same bytes are hashed and, on a miss, decoded.
+    # face_recognition is only imported on a miss, so hits stay cheap
+    with open(image_path, "rb") as f:
+        image_bytes = f.read()
+
+    key = None
+    if cache is not None:
+        key = EncodingCache.key(image_bytes, model, upsample, jitters)
+        encodings = cache.get(key)
+        if encodings is not None:
+            return encodings
+
+    import face_recognition
+
+    image = face_recognition.load_image_file(io.BytesIO(image_bytes))
+    face_locations = face_recognition.face_locations(image, number_of_times_to_upsample=upsample, model=model)
+    encodings = np.asarray(face_recognition.face_encodings(image, face_locations, num_jitters=jitters),
+                           dtype=np.float64).reshape(-1, 128)
+    if cache is not None:
+        cache.put(key, encodings)
+    return encodings
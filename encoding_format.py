@@ -0,0 +1,99 @@
+import struct
+
+import numpy as np
+
+# face_encoding BLOBs. The original format is an untagged float64 array
+# (1 KB for 128 dimensions). Compact encodings start with a tag
+# <magic, format version, precision> followed by float16 values (260 bytes)
+# or a float32 scale and one int8 per dimension (136 bytes)
+MAGIC = b"FE"
+FORMAT_VERSION = 1
+PRECISIONS = ("float64", "float16", "int8")
+STORAGE_DTYPES = {"float64": np.float64, "float16": np.float16, "int8": np.int8}
+_TAG = struct.Struct("<2sBB")
+_PRECISION_IDS = {"float16": 1, "int8": 2}
+_PRECISION_NAMES = {value: key for key, value in _PRECISION_IDS.items()}
+
+
+def quantize(encodings, precision):
+    # (n, dim) float64 -> (codes, per-row float32 scales). int8 scales each
+    # vector by its own largest magnitude so every row uses the full range
+    encodings = np.asarray(encodings, dtype=np.float64)
+    scales = np.ones(len(encodings), dtype=np.float32)
+    if precision == "float64":
+        return encodings, scales
+    if precision == "float16":
+        return encodings.astype(np.float16), scales
+    if precision != "int8":
+        raise ValueError(f"Unknown encoding precision: {precision}")
+
+    peaks = np.abs(encodings).max(axis=1) if encodings.size else np.empty(0)
+    scales = np.where(peaks > 0, peaks / 127.0, 1.0).astype(np.float32)
+    codes = np.rint(encodings / scales[:, None]).clip(-127, 127).astype(np.int8)
+    return codes, scales
+
+
+def dequantize(codes, scales):
+    encodings = np.asarray(codes, dtype=np.float64)
+    if codes.dtype == np.int8:
+        encodings *= np.asarray(scales, dtype=np.float64)[:, None]
+    return encodings
+
+
+def pack(encoding, precision="int8"):
+    encoding = np.asarray(encoding, dtype=np.float64).reshape(1, -1)
+    if precision == "float64":
+        # Kept untagged so older readers still understand it
+        return encoding.tobytes()
+    codes, scales = quantize(encoding, precision)
+    tag = _TAG.pack(MAGIC, FORMAT_VERSION, _PRECISION_IDS[precision])
+    if precision == "int8":
+        return tag + scales.tobytes() + codes.tobytes()
+    return tag + codes.tobytes()
+
+
+def unpack(blob, dim=128):
+    # Any stored format -> float64 vector
+    blob = bytes(blob)
+    if len(blob) == dim * 8:
+        return np.frombuffer(blob, dtype=np.float64)
+
+    if len(blob) < _TAG.size:
+        raise ValueError("Face encoding is too short")
+    magic, version, precision_id = _TAG.unpack_from(blob)
+    if magic != MAGIC or version != FORMAT_VERSION or precision_id not in _PRECISION_NAMES:
+        raise ValueError("Unrecognised face encoding format")
+    payload = blob[_TAG.size:]
+    if _PRECISION_NAMES[precision_id] == "float16":
+        codes, scales = np.frombuffer(payload, dtype=np.float16), np.ones(1, dtype=np.float32)
+    else:
+        scales, codes = np.frombuffer(payload[:4], dtype=np.float32), np.frombuffer(payload[4:], dtype=np.int8)
+    if codes.size != dim:
+        raise ValueError("Face encoding has the wrong length")
+    return dequantize(codes.reshape(1, dim), scales)[0]
+
+
+def migrate_encodings(storage, precision="int8", batch_size=500, dim=128):
+    # Rewrites float64 rows in the compact format, a page at a time. The
+    # old value is part of the WHERE clause so a concurrent re-enrollment
+    # is never overwritten. registration_date is left alone: the vectors
+    # do not change beyond quantization, so other kiosks need not resync
+    if precision == "float64":
+        return 0
+    migrated = 0
+    after_id = 0
+    while True:
+        rows = storage.fetchall(
+            """SELECT student_id, face_encoding FROM students
+            WHERE student_id > %s AND LENGTH(face_encoding) = %s ORDER BY student_id LIMIT %s""",
+            (after_id, dim * 8, batch_size)
+        )
+        if not rows:
+            return migrated
+        after_id = rows[-1]['student_id']
+        storage.executemany(
+            "UPDATE students SET face_encoding = %s WHERE student_id = %s AND face_encoding = %s",
+            [(pack(unpack(row['face_encoding'], dim), precision), row['student_id'], row['face_encoding'])
+             for row in rows]
+        )
+        migrated += len(rows)
@@ -0,0 +1,116 @@
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import metrics
+from detection import detect_faces
+from encoding_cache import cached_face_encodings
+from gallery import FaceGallery
+
+Recognition = namedtuple("Recognition", "box student distance")
+
+
+class RecognitionEngine:
+    # Detection, encoding and matching against the gallery, shared by every
+    # front-end so they all pick up the same detector, precision and
+    # threshold. `student` is None for faces further than `threshold` from
+    # everyone enrolled; accept() is that rule, and front-ends that show a
+    # score use confidence() rather than a cut-off of their own.
+    # The blocking methods run on the caller's thread. The *_async ones run
+    # the same code on `executor`; the default has a single thread because
+    # a loaded detector must not be used by two threads at once
+    def __init__(self, gallery=None, detector="hog", threshold=0.6, scale=1.0, precision="int8", executor=None):
+        self.gallery = gallery if gallery is not None else FaceGallery(precision=precision)
+        self.detector = detector
+        self.threshold = threshold
+        self.scale = scale
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="recognition")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def load_students(self, students):
+        self.gallery.load_students(students)
+
+    def enroll(self, encoding, student):
+        self.gallery.add(encoding, student)
+
+    def detect(self, frame, scale=None):
+        with metrics.STAGE_SECONDS.labels("detect").time():
+            return detect_faces(frame, self.scale if scale is None else scale, detector=self.detector)
+
+    def encode(self, frame, face_locations):
+        # Encodings always come from the full-resolution frame
+        if not len(face_locations):
+            return []
+        import face_recognition
+
+        with metrics.STAGE_SECONDS.labels("encode").time():
+            return face_recognition.face_encodings(frame, face_locations)
+
+    def encode_image(self, image_path, cache=None):
+        # Every face in a photo on disk, as an (n, 128) array
+        return cached_face_encodings(image_path, cache)
+
+    def accept(self, distance):
+        return distance is not None and distance <= self.threshold
+
+    @staticmethod
+    def confidence(distance):
+        # 1.0 for an exact match, falling as the distance grows
+        return None if distance is None else 1 - distance
+
+    def identify(self, face_encodings):
+        # (student, distance) per face, scored against the whole roster at once
+        with metrics.STAGE_SECONDS.labels("match").time():
+            all_matches = self.gallery.match(face_encodings, k=1)
+        identities = []
+        for face_matches in all_matches:
+            student, distance = face_matches[0] if face_matches else (None, None)
+            if student is not None and self.accept(distance):
+                metrics.MATCHES.inc()
+            else:
+                student = None
+                metrics.UNKNOWN_FACES.inc()
+            identities.append((student, distance))
+        return identities
+
+    def match(self, face_locations, face_encodings):
+        # Recognitions for faces detected and encoded elsewhere, e.g. by a
+        # RecognitionPool worker
+        identities = self.identify(face_encodings)
+        return [Recognition(box, student, distance) for box, (student, distance) in zip(face_locations, identities)]
+
+    def recognize(self, frame, scale=None):
+        face_locations = self.detect(frame, scale)
+        return self.match(face_locations, self.encode(frame, face_locations))
+
+    def identify_image(self, image_path, cache=None):
+        return self.identify(self.encode_image(image_path, cache))
+
+    def pool_options(self, scale=None):
+        # Options for RecognitionPool workers, which detect and encode in
+        # their own processes; their results come back to match()
+        return {'scale': self.scale if scale is None else scale, 'detector': self.detector}
+
+    async def recognize_async(self, frame, scale=None):
+        return await self._run(self.recognize, frame, scale)
+
+    async def identify_async(self, face_encodings):
+        return await self._run(self.identify, face_encodings)
+
+    async def identify_image_async(self, image_path, cache=None):
+        return await self._run(self.identify_image, image_path, cache)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    def close(self):
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
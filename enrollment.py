@@ -0,0 +1,213 @@
+import argparse
+import csv
+import os
+import shutil
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from encoding_cache import EncodingCache, cached_face_encodings
+from encoding_format import PRECISIONS, pack
+from storage import open_storage
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+EnrollmentItem = namedtuple("EnrollmentItem", "image_path name age gender email phone")
+EnrollmentFailure = namedtuple("EnrollmentFailure", "image_path name reason")
+
+NO_FACE = "no face found"
+MULTIPLE_FACES = "multiple faces found"
+DUPLICATE = "name already registered"
+
+
+def items_from_directory(directory):
+    # One image per student, named after the student: Jane_Doe.jpg
+    items = []
+    for file_name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(file_name)
+        if ext.lower() in IMAGE_EXTENSIONS:
+            items.append(EnrollmentItem(os.path.join(directory, file_name), stem.replace("_", " ").strip(),
+                                        None, None, None, None))
+    return items
+
+
+def items_from_csv(path):
+    # Columns: image_path,name[,age,gender,email,phone]; image paths are
+    # relative to the manifest
+    base = os.path.dirname(os.path.abspath(path))
+    items = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            image_path = (row.get("image_path") or "").strip()
+            name = (row.get("name") or "").strip()
+            if not image_path or not name:
+                continue
+            items.append(EnrollmentItem(
+                os.path.join(base, image_path), name,
+                row.get("age") or None, row.get("gender") or None,
+                row.get("email") or None, row.get("phone") or None,
+            ))
+    return items
+
+
+# Encoding caches opened in this (worker) process, by directory
+_caches = {}
+
+
+def encode_image(image_path, model="hog", upsample=1, jitters=1, cache_dir=None):
+    # Runs in a pool worker; returns (encoding or None, failure reason or None)
+    cache = None
+    if cache_dir is not None:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            cache = _caches[cache_dir] = EncodingCache(cache_dir)
+
+    try:
+        encodings = cached_face_encodings(image_path, cache, model, upsample, jitters)
+    except Exception as e:
+        return None, f"unreadable image: {e}"
+    if not len(encodings):
+        return None, NO_FACE
+    if len(encodings) > 1:
+        return None, MULTIPLE_FACES
+    return encodings[0], None
+
+
+def stored_image_path(item, image_dir):
+    ext = os.path.splitext(item.image_path)[1].lower() or ".jpg"
+    return os.path.join(image_dir, f"{item.name.replace(' ', '_')}{ext}")
+
+
+class BulkEnrollment:
+    # Encodes on a process pool and inserts students in batched
+    # transactions. `enrolled` holds (encoding, student) pairs ready for
+    # FaceGallery.add_many once the whole run is done
+    def __init__(self, storage, workers=None, batch_size=200, image_dir="student_images", move_images=False,
+                 model="hog", upsample=1, jitters=1, cache=None, progress=None, precision="int8"):
+        self.storage = storage
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.image_dir = image_dir
+        self.move_images = move_images
+        self.precision = precision  # face_encoding format written to the table
+        # Workers open the cache by directory; the eviction pass runs here
+        self.cache = cache
+        self.encoder = partial(encode_image, model=model, upsample=upsample, jitters=jitters,
+                               cache_dir=cache.directory if cache is not None else None)
+        self.progress = progress
+        self.enrolled = []
+        self.failures = []
+
+    def run(self, items):
+        registered = {row['name'] for row in self.storage.fetchall("SELECT name FROM students")}
+        pending = []
+        for item in items:
+            if item.name in registered:
+                self.failures.append(EnrollmentFailure(item.image_path, item.name, DUPLICATE))
+            else:
+                registered.add(item.name)
+                pending.append(item)
+
+        batch = []
+        for done, (item, (encoding, reason)) in enumerate(zip(pending, self.encode(pending)), 1):
+            if reason is not None:
+                self.failures.append(EnrollmentFailure(item.image_path, item.name, reason))
+            else:
+                batch.append((item, encoding))
+            if len(batch) >= self.batch_size:
+                self.insert(batch)
+                batch = []
+            if self.progress is not None:
+                self.progress(done, len(pending))
+        if batch:
+            self.insert(batch)
+        if self.cache is not None:
+            self.cache.evict()
+        return self.enrolled, self.failures
+
+    def encode(self, items):
+        paths = [item.image_path for item in items]
+        if self.workers <= 1 or len(paths) < 2:
+            return map(self.encoder, paths)
+        return self._pool_map(paths)
+
+    def _pool_map(self, paths):
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            chunksize = max(1, min(16, len(paths) // (self.workers * 4)))
+            yield from executor.map(self.encoder, paths, chunksize=chunksize)
+
+    def insert(self, batch):
+        os.makedirs(self.image_dir, exist_ok=True)
+        rows = []
+        for item, encoding in batch:
+            rows.append((item.name, item.age, item.gender, item.email, item.phone,
+                         stored_image_path(item, self.image_dir), pack(encoding, self.precision)))
+
+        # One transaction per batch; ids are looked up by the unique name
+        self.storage.executemany(
+            """INSERT INTO students
+            (name, age, gender, email, phone, image_path, face_encoding)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            rows
+        )
+        names = [row[0] for row in rows]
+        placeholders = ", ".join(["%s"] * len(names))
+        students = {row['name']: row for row in self.storage.fetchall(
+            f"SELECT student_id, name, age, gender, email, phone, image_path FROM students "
+            f"WHERE name IN ({placeholders})",
+            names
+        )}
+
+        for (item, encoding), row in zip(batch, rows):
+            if self.move_images:
+                shutil.move(item.image_path, row[5])
+            else:
+                shutil.copyfile(item.image_path, row[5])
+            self.enrolled.append((encoding, students[item.name]))
+
+
+def write_report(failures, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(EnrollmentFailure._fields)
+        writer.writerows(failures)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enroll students in bulk from an image folder or CSV manifest")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dir", help="Folder of images named after each student (Jane_Doe.jpg)")
+    source.add_argument("--csv", help="Manifest with image_path,name,age,gender,email,phone columns")
+    parser.add_argument("--workers", type=int, help="Encoding processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=200, help="Students per INSERT transaction")
+    parser.add_argument("--move", action="store_true", help="Move photos into student_images/ instead of copying")
+    parser.add_argument("--report", help="Write skipped images to this CSV file")
+    parser.add_argument("--cache-dir", default="encoding_cache", help="Encoding cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-encode every image")
+    parser.add_argument("--precision", choices=PRECISIONS, default="int8", help="Stored face encoding format")
+    parser.add_argument("--backend", choices=["mysql", "sqlite"], help="Storage backend (default from environment)")
+    parser.add_argument("--db-path", help="SQLite database file")
+    args = parser.parse_args(argv)
+
+    storage = open_storage(args.backend, args.db_path, host="localhost", user="root",
+                           password="lashchou", database="attendance_db")
+    try:
+        storage.create_tables()
+        items = items_from_directory(args.dir) if args.dir else items_from_csv(args.csv)
+        cache = None if args.no_cache else EncodingCache(args.cache_dir)
+        enrollment = BulkEnrollment(storage, workers=args.workers, batch_size=args.batch_size,
+                                    move_images=args.move, cache=cache, precision=args.precision)
+        enrolled, failures = enrollment.run(items)
+    finally:
+        storage.close()
+
+    for failure in failures:
+        print(f"skipped {failure.image_path} ({failure.name}): {failure.reason}", file=sys.stderr)
+    if args.report:
+        write_report(failures, args.report)
+    print(f"{len(enrolled)} enrolled, {len(failures)} skipped", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
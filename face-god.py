@@ -1,20 +1,21 @@
 import tkinter as tk
 from tkinter import messagebox, filedialog
 import cv2
-import face_recognition
-import mysql.connector
 from datetime import datetime
 from PIL import Image, ImageTk
 import numpy as np
 
+from capture import CaptureThread, FrameSlot, RecognitionWorker
+from engine import RecognitionEngine
+from storage import open_storage
+
 class FaceRecognitionApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Face Recognition Attendance System")
         
         # Database connection
-        self.conn = None
-        self.cursor = None
+        self.storage = None
         self.connect_to_db()
         
         # GUI Elements
@@ -24,23 +25,25 @@ class FaceRecognitionApp:
         self.video_capture = None
         self.current_frame = None
         self.running = False
+        self.frame_slot = None
+        self.capture_thread = None
+        self.recognition_worker = None
+        self.last_shown_seq = 0
+        self.error_shown = False
         
-        # Face recognition variables
-        self.known_encoding = None
-        self.known_name = ""
-        self.known_age = ""
-        self.known_gender = ""
-        self.student_registered = False
+        # Students registered this session are matched by the shared
+        # engine. Detection runs on a frame shrunk by this factor; encoding
+        # does not
+        self.engine = RecognitionEngine(scale=0.5)
         
     def connect_to_db(self):
         try:
-            self.conn = mysql.connector.connect(
+            self.storage = open_storage(
                 host="localhost",
                 user="root",
                 password="lashchou",
                 database="attendance_db"
             )
-            self.cursor = self.conn.cursor()
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to connect to database: {str(e)}")
     
@@ -97,25 +100,19 @@ class FaceRecognitionApp:
             
         try:
             # Load and encode the face
-            known_image = face_recognition.load_image_file(image_path)
-            face_encodings = face_recognition.face_encodings(known_image)
+            face_encodings = self.engine.encode_image(image_path)
             
-            if not face_encodings:
+            if not len(face_encodings):
                 messagebox.showerror("Face Detection", "No face found in the image")
                 return
                 
-            self.known_encoding = face_encodings[0]
-            self.known_name = name
-            self.known_age = age
-            self.known_gender = gender
-            self.student_registered = True
+            self.engine.enroll(face_encodings[0], {'name': name, 'age': age, 'gender': gender})
             
             # Insert into database
-            self.cursor.execute(
+            self.storage.execute(
                 "INSERT INTO students (name, age, gender, attendance_status) VALUES (%s, %s, %s, %s)",
                 (name, age, gender, "Absent")
             )
-            self.conn.commit()
             
             messagebox.showinfo("Success", "Student registered successfully!")
             
@@ -123,7 +120,7 @@ class FaceRecognitionApp:
             messagebox.showerror("Error", f"Failed to register student: {str(e)}")
     
     def start_attendance(self):
-        if not self.student_registered:
+        if not len(self.engine.gallery):
             messagebox.showwarning("Setup Error", "Please register a student first")
             return
             
@@ -136,6 +133,15 @@ class FaceRecognitionApp:
                 raise Exception("Could not open video device")
                 
             self.running = True
+            self.error_shown = False
+            
+            # Capture and recognition run on their own threads; the Tk loop
+            # only ever draws the newest frame and the newest results
+            self.frame_slot = FrameSlot()
+            self.capture_thread = CaptureThread(self.video_capture, self.frame_slot, self.prepare_frame)
+            self.recognition_worker = RecognitionWorker(self.frame_slot, self.process_faces)
+            self.capture_thread.start()
+            self.recognition_worker.start()
             self.update_video()
         except Exception as e:
             messagebox.showerror("Camera Error", f"Failed to start camera: {str(e)}")
@@ -143,6 +149,13 @@ class FaceRecognitionApp:
     
     def stop_attendance(self):
         self.running = False
+        if self.frame_slot is not None:
+            self.frame_slot.close()
+        for thread in (self.recognition_worker, self.capture_thread):
+            if thread is not None:
+                thread.stop()
+        self.recognition_worker = None
+        self.capture_thread = None
         if self.video_capture is not None:
             self.video_capture.release()
             self.video_capture = None
@@ -150,40 +163,57 @@ class FaceRecognitionApp:
             self.video_label.config(image=None)
         self.video_label.config(text="Video feed stopped")
     
+    def prepare_frame(self, frame):
+        # Convert to RGB and resize for display
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return cv2.resize(frame_rgb, (640, 480))
+    
+    def process_faces(self, frame_rgb):
+        # Runs on the recognition worker; returns what the UI should draw
+        detections = []
+        for face_location, student, distance in self.engine.recognize(frame_rgb):
+            if student is not None:
+                # Update database with attendance
+                self.storage.execute(
+                    "UPDATE students SET attendance_status = %s, timestamp = %s WHERE name = %s",
+                    ("Present", datetime.now(), student['name'])
+                )
+            
+            detections.append((face_location, student))
+        return detections
+    
+    def draw_faces(self, frame_rgb, detections):
+        for (top, right, bottom, left), student in detections:
+            if student is not None:
+                # Draw rectangle and text
+                cv2.rectangle(frame_rgb, (left, top), (right, bottom), (0, 255, 0), 2)
+                cv2.putText(frame_rgb, student['name'], (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                cv2.putText(frame_rgb, student['age'], (left, top - 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                cv2.putText(frame_rgb, student['gender'], (left, top - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                cv2.putText(frame_rgb, "Attendance Marked", (left, bottom + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
+            else:
+                cv2.rectangle(frame_rgb, (left, top), (right, bottom), (0, 0, 255), 2)
+                cv2.putText(frame_rgb, "Unknown", (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+    
     def update_video(self):
         if not self.running:
             return
             
-        ret, frame = self.video_capture.read()
-        if ret:
-            # Convert to RGB and resize for display
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame_rgb = cv2.resize(frame_rgb, (640, 480))
+        # Recognition failures are counted by the worker; the first one of
+        # a run is shown here, on the Tk thread
+        if self.recognition_worker.errors and not self.error_shown:
+            self.error_shown = True
+            messagebox.showerror("Recognition Error", f"Face recognition failed: {str(self.recognition_worker.last_error)}")
             
-            # Face recognition
-            face_locations = face_recognition.face_locations(frame_rgb)
-            face_encodings = face_recognition.face_encodings(frame_rgb, face_locations)
-
-            for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-                matches = face_recognition.compare_faces([self.known_encoding], face_encoding)
-
-                if any(matches):
-                    # Update database with attendance
-                    self.cursor.execute(
-                        "UPDATE students SET attendance_status = %s, timestamp = %s WHERE name = %s",
-                        ("Present", datetime.now(), self.known_name)
-                    )
-                    self.conn.commit()
-
-                    # Draw rectangle and text
-                    cv2.rectangle(frame_rgb, (left, top), (right, bottom), (0, 255, 0), 2)
-                    cv2.putText(frame_rgb, self.known_name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                    cv2.putText(frame_rgb, self.known_age, (left, top - 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                    cv2.putText(frame_rgb, self.known_gender, (left, top - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                    cv2.putText(frame_rgb, "Attendance Marked", (left, bottom + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
-                else:
-                    cv2.rectangle(frame_rgb, (left, top), (right, bottom), (0, 0, 255), 2)
-                    cv2.putText(frame_rgb, "Unknown", (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+        packet = self.frame_slot.latest()
+        if packet is not None and packet.seq != self.last_shown_seq:
+            self.last_shown_seq = packet.seq
+            
+            # The worker may still be reading this frame, so draw on a copy
+            frame_rgb = packet.value.copy()
+            result = self.recognition_worker.result_slot.latest()
+            if result is not None:
+                self.draw_faces(frame_rgb, result.value)
             
             # Convert to PhotoImage
             img = Image.fromarray(frame_rgb)
@@ -197,10 +227,9 @@ class FaceRecognitionApp:
     
     def on_closing(self):
         self.stop_attendance()
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
+        self.engine.close()
+        if self.storage:
+            self.storage.close()
         self.root.destroy()
 
 if __name__ == "__main__":
@@ -3,6 +3,9 @@ from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
 import datetime
 
+from engine import RecognitionEngine
+from storage import open_storage
+
 class AttendanceApp:
     def __init__(self, root):
         self.root = root
@@ -13,8 +16,28 @@ class AttendanceApp:
         self.photo_path = None
         self.clock_label = None
 
+        # Uploaded photos are matched against the registered students by the
+        # same engine the camera apps use, off the Tk thread
+        self.storage = None
+        self.engine = RecognitionEngine()
+        self.connect_to_db()
+
         self.create_widgets()
 
+    def connect_to_db(self):
+        try:
+            self.storage = open_storage(
+                host="localhost",
+                user="root",
+                password="lashchou",
+                database="attendance_db"
+            )
+            self.engine.load_students(self.storage.fetchall(
+                "SELECT student_id, name, age, gender, email, phone, image_path, face_encoding FROM students"
+            ))
+        except Exception as e:
+            messagebox.showerror("Database Error", f"Failed to load students: {str(e)}")
+
     def create_widgets(self):
         # Header
         header = tk.Label(self.root, text="Smart Attendance System", font=("Helvetica", 24, "bold"), bg="#2c3e50", fg="white", pady=10)
@@ -82,9 +105,53 @@ class AttendanceApp:
             messagebox.showerror("Missing Fields", "Please complete all fields and upload a photo.")
             self.status_label.configure(text="Status: Missing input ❌", fg="red")
             return
-        # Simulate attendance marking
-        self.status_label.configure(text=f"Attendance marked for {name} (Roll: {roll}) ✅", fg="green")
-        messagebox.showinfo("Success", f"Attendance marked for {name}!")
+        if self.storage is None or not len(self.engine.gallery):
+            messagebox.showerror("Setup Error", "No registered students to match against.")
+            return
+
+        self.mark_btn.state(["disabled"])
+        self.status_label.configure(text="Status: Recognizing photo...", fg="gray")
+        future = self.engine.executor.submit(self.recognize_photo, self.photo_path, name)
+        self.root.after(50, self.check_recognition, future, name, roll)
+
+    def recognize_photo(self, photo_path, name):
+        # Runs on the engine's executor. Returns (student, faces found, first
+        # recognised student); attendance is written only when a face in the
+        # photo is the student named in the form
+        identities = self.engine.identify_image(photo_path)
+        students = [student for student, distance in identities if student is not None]
+        for student in students:
+            if student['name'].strip().lower() == name.strip().lower():
+                now = datetime.datetime.now()
+                self.storage.write_attendance([(student['student_id'], now.date(), now, "Present")], [])
+                return student, len(identities), student
+        return None, len(identities), students[0] if students else None
+
+    def check_recognition(self, future, name, roll):
+        if not future.done():
+            self.root.after(50, self.check_recognition, future, name, roll)
+            return
+        self.mark_btn.state(["!disabled"])
+
+        try:
+            student, faces, recognised = future.result()
+        except Exception as e:
+            messagebox.showerror("Recognition Error", f"Failed to mark attendance: {str(e)}")
+            self.status_label.configure(text="Status: Recognition failed ❌", fg="red")
+            return
+
+        if student is None:
+            if not faces:
+                message = "No face found in the photo."
+            elif recognised is not None:
+                message = f"The photo matches {recognised['name']}, not {name}."
+            else:
+                message = "The face in the photo does not match any registered student."
+            messagebox.showerror("Not Recognized", message)
+            self.status_label.configure(text="Status: Face not recognized ❌", fg="red")
+            return
+        self.status_label.configure(text=f"Attendance marked for {student['name']} (Roll: {roll}) ✅", fg="green")
+        messagebox.showinfo("Success", f"Attendance marked for {student['name']}!")
 
     def clear_fields(self):
         self.name_entry.delete(0, tk.END)
@@ -95,7 +162,15 @@ class AttendanceApp:
         self.status_label.configure(text="Status: Fields cleared", fg="gray")
 
 
+    def on_closing(self):
+        self.engine.close()
+        if self.storage:
+            self.storage.close()
+        self.root.destroy()
+
+
 if __name__ == '__main__':
     root = tk.Tk()
     app = AttendanceApp(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
@@ -1,14 +1,33 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import cv2
-import face_recognition
-import mysql.connector
-from datetime import datetime
 from PIL import Image, ImageTk
-import numpy as np
+import math
 import os
 from tkinter.font import Font
 import threading
+import queue
+import time
+
+import metrics
+from ann_index import create_index, load_index, save_index
+from attendance import AttendanceState, AttendanceWriter
+from attendance_log import AttendanceLog
+from capture import FairScheduler, RecognitionWorker, VideoFileCapture, VideoSource
+from detection import get_detector
+from detectors import DETECTOR_TYPES, available_detectors, calibrate
+from display import FramePreparer, TileRenderer
+from encoding_cache import EncodingCache
+from encoding_format import migrate_encodings, pack
+from engine import RecognitionEngine
+from enrollment import BulkEnrollment, items_from_csv, items_from_directory, write_report
+from gallery import load_snapshot, save_snapshot
+from gallery_sync import GallerySync, newest_registration
+from motion import MotionGate
+from pacing import AdaptiveScheduler
+from recognition_pool import PoolRecognitionWorker, RecognitionPool
+from recording import EXTENSION, FrameRecorder, RecordingCapture, ReplayCapture
+from storage import open_storage
+from tracking import FaceTracker
 
 class EnhancedFaceRecognitionApp:
     def __init__(self, root):
@@ -21,28 +40,115 @@ class EnhancedFaceRecognitionApp:
         self.configure_styles()
         
         # Database connection
-        self.conn = None
-        self.cursor = None
+        self.storage = None
         self.connect_to_db()
         self.create_tables()  # Ensure tables exist
         
-        # Video capture
-        self.video_capture = None
+        # Video capture: camera indexes and/or video files, comma separated.
+        # Every source gets its own capture thread and tracker; one
+        # recognition worker serves them all in turn
+        self.camera_sources = "0"
+        self.sources = []
         self.current_frame = None
         self.running = False
         self.attendance_running = False
-        
-        # Face recognition variables
-        self.known_encodings = []
-        self.known_students = []
+        self.frame_scheduler = None
+        self.recognition_worker = None
+        self.recognition_errors = 0
+        self.tile_size = (640, 480)
+        
+        # Sources ending in .frec replay a recording; with recording on,
+        # every camera's frames are also written to recordings/
+        self.record_cameras = False
+        
+        # More than one worker runs detection/encoding on a process pool
+        self.recognition_workers = 1
+        self.recognition_pool = None
+        
+        # Work handed back to the Tk thread by the recognition worker
+        self.ui_queue = queue.Queue()
+        
+        # Today's check-ins are answered from memory; writes are batched
+        self.attendance_flush_interval = 1.0
+        self.attendance_state = AttendanceState(loader=self.load_attendance_day)
+        self.attendance_writer = AttendanceWriter(
+            self.storage,
+            flush_interval=self.attendance_flush_interval,
+            on_error=lambda e: self.post_to_ui(messagebox.showerror, "Database Error",
+                                               f"Failed to save attendance, will keep retrying: {str(e)}"),
+            on_recover=lambda failures: self.post_to_ui(messagebox.showinfo, "Database",
+                                                        f"Attendance saving resumed after {failures} failed attempts"),
+            unsent_path=os.path.join(self.storage.data_dir if self.storage else ".", "unsent_attendance.jsonl")
+        )
+        self.attendance_writer.start()
+        
+        # Face recognition variables. Encodings are held and stored as int8
+        # (136 bytes a face instead of 1 KB); float64 rows written by older
+        # versions are converted in the background. The engine owns the
+        # gallery, detector and threshold used for every recognition
+        self.encoding_precision = "int8"
+        self.engine = RecognitionEngine(precision=self.encoding_precision)
+        self.gallery = self.engine.gallery
+        self.search_mode = "exact"  # "exact", "ivf" or "lsh"
+        self.index_dir = self.storage.data_dir if self.storage else "."
+        self.encoding_cache = EncodingCache(os.path.join(self.index_dir, "encoding_cache"))
+        self.recordings_dir = os.path.join(self.index_dir, "recordings")
+        self.roster_state = None
+        self.roster_last_date = None
         self.load_registered_students()
         
+        # Students enrolled at other kiosks are picked up in the background
+        self.gallery_sync_interval = 30.0
+        self.gallery_sync = GallerySync(
+            self.storage, self.gallery,
+            interval=self.gallery_sync_interval,
+            on_update=lambda added, replaced: self.post_to_ui(self.gallery_synced, added, replaced),
+            last_date=self.roster_last_date
+        )
+        self.gallery_sync.start()
+        
         # Threshold for face recognition
-        self.face_recognition_threshold = 0.6
+        self.engine.threshold = 0.6
+        
+        # Detection runs on a frame shrunk by this factor; encoding does not
+        self.detection_scale = 0.5
+        
+        # Detector backend. "auto" times every backend that loads here on
+        # the first camera frames and keeps the fastest one whose accuracy
+        # against HOG stays above the floor
+        self.detector_choice = "auto"
+        self.engine.detector = "hog"
+        self.detector_accuracy_floor = 0.8
+        self.calibration_frames = 10
+        
+        # Recognition is skipped while a camera sees a static scene (less
+        # than motion_area of the frame changing), and the display slows
+        # down while every camera is idle
+        self.motion_area = 0.01
+        self.motion_cooldown = 2.0
+        self.idle_display_fps = 5
+        
+        # Display and recognition are paced to their own targets; when
+        # recognition falls behind, the scheduler skips frames and lowers
+        # the detection scale below the one chosen above
+        self.pacer = AdaptiveScheduler(display_fps=30, recognition_fps=10, max_scale=self.detection_scale)
+        
+        # Per-stage latency metrics; ATTENDANCE_METRICS_PORT also serves them
+        # to Prometheus on localhost
+        self.metrics_window = None
+        self.metrics_server = None
+        self.start_metrics_server()
         
         # GUI Elements
         self.create_widgets()
         
+        # Started once status_var exists, since it reports there
+        threading.Thread(target=self.migrate_stored_encodings, daemon=True).start()
+        
+        # Background work (enrollment, DB errors) reports back even while
+        # the camera is off
+        self.pump_ui_queue()
+        
     def configure_styles(self):
         self.style = ttk.Style()
         self.style.configure('TFrame', background='#f0f0f0')
@@ -54,89 +160,157 @@ class EnhancedFaceRecognitionApp:
         
     def connect_to_db(self):
         try:
-            self.conn = mysql.connector.connect(
+            # Pooled MySQL by default; ATTENDANCE_DB_BACKEND=sqlite for a
+            # single kiosk without a database server
+            self.storage = open_storage(
                 host="localhost",
                 user="root",
                 password="lashchou",
-                database="attendance_db",
-                autocommit=True
+                database="attendance_db"
             )
-            self.cursor = self.conn.cursor(dictionary=True)
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to connect to database: {str(e)}")
     
     def create_tables(self):
         try:
-            # Students table
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS students (
-                    student_id INT AUTO_INCREMENT PRIMARY KEY,
-                    name VARCHAR(100) NOT NULL,
-                    age INT,
-                    gender VARCHAR(20),
-                    email VARCHAR(100),
-                    phone VARCHAR(20),
-                    image_path VARCHAR(255),
-                    face_encoding BLOB,
-                    registration_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE KEY unique_name (name)
-                )
-            """)
-            
-            # Attendance table
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS attendance (
-                    attendance_id INT AUTO_INCREMENT PRIMARY KEY,
-                    student_id INT,
-                    date DATE NOT NULL,
-                    time_in DATETIME,
-                    time_out DATETIME,
-                    status VARCHAR(20),
-                    FOREIGN KEY (student_id) REFERENCES students(student_id),
-                    UNIQUE KEY unique_attendance (student_id, date)
-                )
-            """)
-            
-            # Courses table (optional for future expansion)
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS courses (
-                    course_id INT AUTO_INCREMENT PRIMARY KEY,
-                    name VARCHAR(100) NOT NULL,
-                    description TEXT
-                )
-            """)
-            
-            # Student courses (junction table)
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS student_courses (
-                    student_id INT,
-                    course_id INT,
-                    PRIMARY KEY (student_id, course_id),
-                    FOREIGN KEY (student_id) REFERENCES students(student_id),
-                    FOREIGN KEY (course_id) REFERENCES courses(course_id)
-                )
-            """)
-            
+            self.storage.create_tables()
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to create tables: {str(e)}")
     
     def load_registered_students(self):
         try:
-            self.cursor.execute("SELECT * FROM students")
-            students = self.cursor.fetchall()
-            
-            self.known_encodings = []
-            self.known_students = []
-            
-            for student in students:
-                if student['face_encoding']:
-                    encoding = np.frombuffer(student['face_encoding'], dtype=np.float64)
-                    self.known_encodings.append(encoding)
-                    self.known_students.append(student)
+            # The snapshot from the last run is memory-mapped when the table
+            # still has the same row count and newest id; otherwise reload
+            roster_state = self.fetch_roster_state()
+            # Read before the load, so GallerySync also picks up anyone
+            # enrolled while it runs
+            self.roster_last_date = newest_registration(self.storage)
+            if not load_snapshot(self.gallery, self.snapshot_prefix(), roster_state):
+                students = self.storage.fetchall(
+                    "SELECT student_id, name, age, gender, email, phone, image_path, face_encoding FROM students"
+                )
+                self.gallery.load_students(students)
+                self.save_gallery_snapshot(roster_state)
+            self.roster_state = roster_state
+            self.attach_index()
                     
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to load students: {str(e)}")
     
+    def migrate_stored_encodings(self):
+        if self.storage is None:
+            return
+        try:
+            migrated = migrate_encodings(self.storage, self.encoding_precision)
+        except Exception as e:
+            self.post_to_ui(messagebox.showerror, "Database Error", f"Failed to convert face encodings: {str(e)}")
+            return
+        if migrated:
+            self.post_to_ui(self.status_var.set,
+                            f"Converted {migrated} stored face encodings to {self.encoding_precision}")
+    
+    def gallery_synced(self, added, replaced):
+        self.save_index()
+        self.status_var.set(f"Roster synced: {added} new, {replaced} updated ({len(self.gallery)} students)")
+    
+    def fetch_roster_state(self):
+        # The newest registration_date catches re-enrolled rows, which
+        # change neither the count nor the max id. It is kept as text so
+        # it compares equal to the copy stored in the snapshot's JSON
+        row = self.storage.fetchone(
+            """SELECT COUNT(*) AS student_count, MAX(student_id) AS max_id,
+            MAX(registration_date) AS last_registered FROM students"""
+        )
+        last_registered = str(row['last_registered']) if row['last_registered'] is not None else None
+        return (row['student_count'], row['max_id'], last_registered)
+    
+    def snapshot_prefix(self):
+        return os.path.join(self.index_dir, "attendance_db.gallery")
+    
+    def save_gallery_snapshot(self, roster_state):
+        # The snapshot is only a startup cache; failing to write it just
+        # means a full load next time
+        try:
+            save_snapshot(self.gallery, self.snapshot_prefix(), roster_state)
+        except Exception:
+            pass
+    
+    def index_path(self, kind):
+        return os.path.join(self.index_dir, f"attendance_db.{kind}.npz")
+    
+    def attach_index(self):
+        if self.search_mode == "exact":
+            self.gallery.set_index(None)
+            return
+            
+        # Reuse the saved index unless the roster changed underneath it
+        path = self.index_path(self.search_mode)
+        ids = self.gallery.student_ids()
+        index = None
+        if os.path.exists(path):
+            try:
+                index = load_index(path, ids)
+            except Exception:
+                index = None
+                
+        if index is None:
+            index = create_index(self.search_mode)
+            self.gallery.set_index(index)
+            self.save_index()
+        else:
+            self.gallery.set_index(index)
+    
+    def save_index(self):
+        index = self.gallery.index
+        if index is None or not index.is_trained:
+            return
+        try:
+            save_index(index, self.index_path(index.kind), self.gallery.student_ids())
+        except Exception as e:
+            messagebox.showerror("Index Error", f"Failed to save search index: {str(e)}")
+    
+    def start_metrics_server(self):
+        port = os.environ.get("ATTENDANCE_METRICS_PORT")
+        if not port:
+            return
+        try:
+            self.metrics_server = metrics.start_http_server(int(port))
+        except Exception as e:
+            messagebox.showerror("Metrics Error", f"Failed to start metrics exporter: {str(e)}")
+    
+    def show_metrics(self):
+        if self.metrics_window is not None and self.metrics_window.winfo_exists():
+            self.metrics_window.lift()
+            return
+        self.metrics_window = tk.Toplevel(self.root)
+        self.metrics_window.title("Pipeline Metrics")
+        self.metrics_text = tk.Text(self.metrics_window, width=80, height=24, font=('Courier', 9))
+        self.metrics_text.pack(fill=tk.BOTH, expand=True)
+        self.refresh_metrics()
+    
+    def refresh_metrics(self):
+        if self.metrics_window is None or not self.metrics_window.winfo_exists():
+            self.metrics_window = None
+            return
+        lines = []
+        for name, series in metrics.REGISTRY.snapshot().items():
+            for labels, value in series.items():
+                label = name if labels == "value" else f"{name}{labels}"
+                if isinstance(value, dict) and name.endswith("_seconds"):
+                    lines.append(f"{label}: n={value['count']} p50={value['p50'] * 1000:.1f}ms "
+                                 f"p95={value['p95'] * 1000:.1f}ms p99={value['p99'] * 1000:.1f}ms")
+                elif isinstance(value, dict):
+                    lines.append(f"{label}: n={value['count']} mean={value['mean']:.2f}")
+                else:
+                    lines.append(f"{label}: {value:g}")
+        self.metrics_text.delete("1.0", tk.END)
+        self.metrics_text.insert(tk.END, "\n".join(lines))
+        self.root.after(1000, self.refresh_metrics)
+    
+    def set_search_mode(self, mode):
+        self.search_mode = mode
+        self.attach_index()
+    
     def create_widgets(self):
         # Main container
         main_frame = ttk.Frame(self.root)
@@ -187,6 +361,7 @@ class EnhancedFaceRecognitionApp:
         
         ttk.Button(reg_frame, text="Register Student", command=self.register_student, 
                   style='Accent.TButton').pack(fill=tk.X, pady=10)
+        ttk.Button(reg_frame, text="Bulk Enroll...", command=self.bulk_enroll).pack(fill=tk.X)
         
         # Attendance Control Section
         att_frame = ttk.LabelFrame(left_frame, text="Attendance Control", padding=10)
@@ -196,16 +371,71 @@ class EnhancedFaceRecognitionApp:
         ttk.Button(att_frame, text="Start Attendance", command=self.start_attendance).pack(fill=tk.X, pady=5)
         ttk.Button(att_frame, text="Stop Attendance", command=self.stop_attendance).pack(fill=tk.X, pady=5)
         ttk.Button(att_frame, text="Stop Camera", command=self.stop_camera).pack(fill=tk.X, pady=5)
+        ttk.Button(att_frame, text="Show Metrics", command=self.show_metrics).pack(fill=tk.X, pady=5)
         
         # Settings Section
         settings_frame = ttk.LabelFrame(left_frame, text="Settings", padding=10)
         settings_frame.pack(fill=tk.X, pady=5)
         
         ttk.Label(settings_frame, text="Recognition Threshold:").pack(anchor=tk.W)
-        self.threshold_slider = ttk.Scale(settings_frame, from_=0.3, to=1.0, value=self.face_recognition_threshold,
-                                        command=lambda v: setattr(self, 'face_recognition_threshold', float(v)))
+        self.threshold_slider = ttk.Scale(settings_frame, from_=0.3, to=1.0, value=self.engine.threshold,
+                                        command=lambda v: setattr(self.engine, 'threshold', float(v)))
         self.threshold_slider.pack(fill=tk.X, pady=5)
         
+        ttk.Label(settings_frame, text="Detection Scale:").pack(anchor=tk.W)
+        self.scale_combobox = ttk.Combobox(settings_frame, values=["1.0", "0.5", "0.25"], state="readonly")
+        self.scale_combobox.set(str(self.detection_scale))
+        self.scale_combobox.bind("<<ComboboxSelected>>",
+                                 lambda e: self.set_detection_scale(float(self.scale_combobox.get())))
+        self.scale_combobox.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(settings_frame, text="Detector:").pack(anchor=tk.W)
+        self.detector_combobox = ttk.Combobox(settings_frame, values=["auto"] + list(DETECTOR_TYPES), state="readonly")
+        self.detector_combobox.set(self.detector_choice)
+        self.detector_combobox.bind("<<ComboboxSelected>>",
+                                    lambda e: self.set_detector(self.detector_combobox.get()))
+        self.detector_combobox.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(settings_frame, text="Motion Threshold (% of frame, 0 = off):").pack(anchor=tk.W)
+        self.motion_slider = ttk.Scale(settings_frame, from_=0.0, to=5.0, value=self.motion_area * 100,
+                                       command=lambda v: setattr(self, 'motion_area', float(v) / 100))
+        self.motion_slider.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(settings_frame, text="Matching:").pack(anchor=tk.W)
+        self.search_mode_combobox = ttk.Combobox(settings_frame, values=["exact", "ivf", "lsh"], state="readonly")
+        self.search_mode_combobox.set(self.search_mode)
+        self.search_mode_combobox.bind("<<ComboboxSelected>>",
+                                       lambda e: self.set_search_mode(self.search_mode_combobox.get()))
+        self.search_mode_combobox.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(settings_frame, text="Recognition Workers (next camera start):").pack(anchor=tk.W)
+        self.workers_spinbox = ttk.Spinbox(settings_frame, from_=1, to=os.cpu_count() or 1, width=5,
+                                           command=lambda: setattr(self, 'recognition_workers',
+                                                                   int(self.workers_spinbox.get())))
+        self.workers_spinbox.set(self.recognition_workers)
+        self.workers_spinbox.pack(anchor=tk.W, pady=5)
+        
+        ttk.Label(settings_frame, text="Cameras (index or file, comma separated):").pack(anchor=tk.W)
+        self.sources_var = tk.StringVar(value=self.camera_sources)
+        ttk.Entry(settings_frame, textvariable=self.sources_var).pack(fill=tk.X, pady=5)
+        self.record_var = tk.BooleanVar(value=self.record_cameras)
+        ttk.Checkbutton(settings_frame, text="Record camera input", variable=self.record_var,
+                        command=lambda: setattr(self, 'record_cameras', self.record_var.get())).pack(anchor=tk.W)
+        
+        ttk.Label(settings_frame, text="Target FPS (display / recognition):").pack(anchor=tk.W)
+        fps_frame = ttk.Frame(settings_frame)
+        fps_frame.pack(anchor=tk.W, pady=5)
+        self.display_fps_spinbox = ttk.Spinbox(fps_frame, from_=5, to=60, width=5,
+                                               command=lambda: setattr(self.pacer, 'display_fps',
+                                                                       int(self.display_fps_spinbox.get())))
+        self.display_fps_spinbox.set(self.pacer.display_fps)
+        self.display_fps_spinbox.pack(side=tk.LEFT)
+        self.recognition_fps_spinbox = ttk.Spinbox(fps_frame, from_=1, to=30, width=5,
+                                                   command=lambda: setattr(self.pacer, 'recognition_fps',
+                                                                           int(self.recognition_fps_spinbox.get())))
+        self.recognition_fps_spinbox.set(self.pacer.recognition_fps)
+        self.recognition_fps_spinbox.pack(side=tk.LEFT, padx=5)
+        
         # Video Display
         video_frame = ttk.LabelFrame(right_frame, text="Camera Feed", padding=10)
         video_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -213,6 +443,13 @@ class EnhancedFaceRecognitionApp:
         self.video_label = ttk.Label(video_frame, text="Camera feed will appear here", anchor=tk.CENTER)
         self.video_label.pack(fill=tk.BOTH, expand=True)
         
+        # One tile per source, laid out in a grid while the cameras run
+        self.video_grid = ttk.Frame(video_frame)
+        
+        # Effective rates reported by the scheduler
+        self.rate_var = tk.StringVar()
+        ttk.Label(video_frame, textvariable=self.rate_var, anchor=tk.W).pack(side=tk.BOTTOM, fill=tk.X)
+        
         # Attendance Log
         log_frame = ttk.LabelFrame(right_frame, text="Attendance Log", padding=10)
         log_frame.pack(fill=tk.BOTH, pady=5)
@@ -228,6 +465,15 @@ class EnhancedFaceRecognitionApp:
         scrollbar = ttk.Scrollbar(log_frame, orient="vertical", command=self.attendance_tree.yview)
         self.attendance_tree.configure(yscrollcommand=scrollbar.set)
         
+        # The log shows a bounded number of recent rows, updated in batches;
+        # earlier history is paged in from the database on request
+        self.attendance_log = AttendanceLog(self.attendance_tree, self.storage, capacity=200,
+                                            post=self.post_to_ui)
+        history_buttons = ttk.Frame(log_frame)
+        history_buttons.pack(side=tk.BOTTOM, fill=tk.X)
+        ttk.Button(history_buttons, text="Older", command=self.attendance_log.show_older).pack(side=tk.LEFT)
+        ttk.Button(history_buttons, text="Latest", command=self.attendance_log.show_latest).pack(side=tk.LEFT)
+        
         self.attendance_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
@@ -270,16 +516,15 @@ class EnhancedFaceRecognitionApp:
             return
             
         try:
-            # Load and encode the face
-            known_image = face_recognition.load_image_file(image_path)
-            face_encodings = face_recognition.face_encodings(known_image)
+            # Load and encode the face; photos seen before come from the cache
+            face_encodings = self.engine.encode_image(image_path, self.encoding_cache)
             
-            if not face_encodings:
+            if not len(face_encodings):
                 messagebox.showerror("Face Detection", "No face found in the image")
                 return
                 
             face_encoding = face_encodings[0]
-            encoding_bytes = face_encoding.tobytes()
+            encoding_bytes = pack(face_encoding, self.encoding_precision)
             
             # Save image to a dedicated folder
             os.makedirs("student_images", exist_ok=True)
@@ -287,7 +532,7 @@ class EnhancedFaceRecognitionApp:
             os.replace(image_path, new_image_path)
             
             # Insert into database
-            self.cursor.execute(
+            student_id = self.storage.execute(
                 """INSERT INTO students 
                 (name, age, gender, email, phone, image_path, face_encoding) 
                 VALUES (%s, %s, %s, %s, %s, %s, %s)""",
@@ -295,9 +540,8 @@ class EnhancedFaceRecognitionApp:
             )
             
             # Update in-memory data
-            self.known_encodings.append(face_encoding)
-            self.known_students.append({
-                'student_id': self.cursor.lastrowid,
+            self.gallery.add(face_encoding, {
+                'student_id': student_id,
                 'name': name,
                 'age': age,
                 'gender': gender,
@@ -305,15 +549,70 @@ class EnhancedFaceRecognitionApp:
                 'phone': phone,
                 'image_path': new_image_path
             })
+            self.save_index()
             
             messagebox.showinfo("Success", "Student registered successfully!")
             self.clear_registration_form()
             
-        except mysql.connector.IntegrityError:
+        except self.storage.IntegrityError:
             messagebox.showerror("Error", "A student with this name already exists")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to register student: {str(e)}")
     
+    def bulk_enroll(self):
+        source = filedialog.askopenfilename(
+            title="Select Enrollment Manifest (Cancel to pick an image folder)",
+            filetypes=[("CSV Manifest", "*.csv")]
+        )
+        if not source:
+            source = filedialog.askdirectory(title="Select Folder of Student Images")
+        if not source:
+            return
+            
+        try:
+            items = items_from_csv(source) if os.path.isfile(source) else items_from_directory(source)
+        except Exception as e:
+            messagebox.showerror("Enrollment Error", f"Failed to read {source}: {str(e)}")
+            return
+        if not items:
+            messagebox.showwarning("Enrollment", "No images found to enroll")
+            return
+            
+        # Encoding and inserts run off the Tk thread; the gallery is only
+        # touched once, when the whole run has finished
+        enrollment = BulkEnrollment(
+            self.storage,
+            cache=self.encoding_cache,
+            precision=self.encoding_precision,
+            progress=lambda done, total: self.post_to_ui(self.status_var.set, f"Enrolling: {done}/{total}")
+        )
+        threading.Thread(target=self.run_bulk_enrollment, args=(enrollment, items, source), daemon=True).start()
+        self.status_var.set(f"Enrolling {len(items)} students...")
+    
+    def run_bulk_enrollment(self, enrollment, items, source):
+        try:
+            enrollment.run(items)
+        except Exception as e:
+            self.post_to_ui(messagebox.showerror, "Enrollment Error", f"Bulk enrollment stopped: {str(e)}")
+        self.post_to_ui(self.finish_bulk_enrollment, enrollment, source)
+    
+    def finish_bulk_enrollment(self, enrollment, source):
+        if enrollment.enrolled:
+            encodings, students = zip(*enrollment.enrolled)
+            self.gallery.add_many(encodings, list(students))
+            self.save_index()
+            
+        message = f"{len(enrollment.enrolled)} students enrolled, {len(enrollment.failures)} skipped"
+        if enrollment.failures:
+            report_path = os.path.join(os.path.dirname(os.path.abspath(source)), "enrollment_report.csv")
+            try:
+                write_report(enrollment.failures, report_path)
+                message += f"\n\nSkipped images are listed in {report_path}"
+            except Exception as e:
+                message += f"\n\nFailed to write report: {str(e)}"
+        self.status_var.set("Ready")
+        messagebox.showinfo("Bulk Enrollment", message)
+    
     def clear_registration_form(self):
         self.image_path.set("")
         self.name_entry.delete(0, tk.END)
@@ -324,29 +623,99 @@ class EnhancedFaceRecognitionApp:
         self.image_preview.config(image=None)
         self.image_preview.image = None
     
+    def parse_camera_sources(self):
+        sources = []
+        for item in self.sources_var.get().split(","):
+            item = item.strip()
+            if item:
+                sources.append(int(item) if item.isdigit() else item)
+        return sources or [0]
+    
     def start_camera(self):
         if self.running:
             return
             
         try:
-            self.video_capture = cv2.VideoCapture(0)
-            if not self.video_capture.isOpened():
-                raise Exception("Could not open video device")
+            self.camera_sources = self.sources_var.get()
+            for spec in self.parse_camera_sources():
+                video_capture = self.open_capture(spec)
+                if not video_capture.isOpened():
+                    video_capture.release()
+                    raise Exception(f"Could not open video source {spec}")
+                # Faces are tracked between detections and encoded once per track
+                source = VideoSource(str(spec), video_capture, self.frame_preparer(),
+                                     state=FaceTracker(detect_interval=10))
+                source.motion_gate = MotionGate(self.motion_area, cooldown=self.motion_cooldown, source=source.name,
+                                                cost=lambda: self.pacer.recognition_cost)
+                self.sources.append(source)
                 
             self.running = True
-            self.status_var.set("Camera: ON")
+            self.recognition_errors = 0
+            self.create_video_tiles()
+            
+            # Capture and recognition run on their own threads; the Tk loop
+            # only ever draws the newest frame and the newest results
+            self.frame_scheduler = FairScheduler([source.frame_slot for source in self.sources])
+            self.pacer.sources = len(self.sources)
+            self.recognition_worker = self.create_recognition_worker()
+            for source in self.sources:
+                source.start()
+            self.recognition_worker.start()
+            
+            self.status_var.set(f"Camera: ON ({len(self.sources)} sources)")
+            if self.detector_choice == "auto":
+                self.calibrate_detector()
             self.update_video()
+            self.update_rates()
         except Exception as e:
             messagebox.showerror("Camera Error", f"Failed to start camera: {str(e)}")
             self.stop_camera()
     
+    def open_capture(self, spec):
+        import cv2
+        
+        # Recordings and video files loop at their original frame timing,
+        # like a camera would deliver them
+        if isinstance(spec, str) and spec.endswith(EXTENSION):
+            video_capture = ReplayCapture(spec, realtime=True, loop=True)
+        elif isinstance(spec, str) and os.path.isfile(spec):
+            video_capture = VideoFileCapture(spec, realtime=True, loop=True)
+        else:
+            video_capture = cv2.VideoCapture(spec)
+        if self.record_cameras and video_capture.isOpened():
+            os.makedirs(self.recordings_dir, exist_ok=True)
+            name = os.path.splitext(os.path.basename(str(spec)))[0]
+            path = os.path.join(self.recordings_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}{EXTENSION}")
+            video_capture = RecordingCapture(video_capture, FrameRecorder(path, source=str(spec)))
+        return video_capture
+    
+    def create_video_tiles(self):
+        columns = math.ceil(math.sqrt(len(self.sources)))
+        self.tile_size = (640 // columns, 480 // columns) if columns > 1 else (640, 480)
+        self.video_label.pack_forget()
+        self.video_grid.pack(fill=tk.BOTH, expand=True)
+        for i, source in enumerate(self.sources):
+            tile = ttk.LabelFrame(self.video_grid, text=source.name)
+            tile.grid(row=i // columns, column=i % columns, padx=2, pady=2)
+            label = ttk.Label(tile, anchor=tk.CENTER)
+            label.pack()
+            source.renderer = TileRenderer(label, self.tile_size)
+    
     def stop_camera(self):
         self.running = False
-        if self.video_capture is not None:
-            self.video_capture.release()
-            self.video_capture = None
-        if hasattr(self.video_label, 'imgtk'):
-            self.video_label.config(image=None)
+        if self.frame_scheduler is not None:
+            self.frame_scheduler.close()
+        for source in self.sources:
+            source.stop()
+        if self.recognition_worker is not None:
+            self.recognition_worker.stop()
+        self.recognition_worker = None
+        self.frame_scheduler = None
+        self.sources = []
+        for tile in self.video_grid.winfo_children():
+            tile.destroy()
+        self.video_grid.pack_forget()
+        self.video_label.pack(fill=tk.BOTH, expand=True)
         self.video_label.config(text="Camera feed stopped")
         self.status_var.set("Camera: OFF")
     
@@ -355,7 +724,7 @@ class EnhancedFaceRecognitionApp:
             messagebox.showwarning("Camera Error", "Please start the camera first")
             return
             
-        if not self.known_students:
+        if not len(self.gallery):
             messagebox.showwarning("Setup Error", "No students registered for attendance")
             return
             
@@ -369,112 +738,264 @@ class EnhancedFaceRecognitionApp:
         self.attendance_running = False
         self.status_var.set("Attendance: OFF")
     
+    def frame_preparer(self):
+        # Converts to RGB and resizes for display; each capture thread
+        # gets its own, since it reuses a scratch buffer
+        return FramePreparer((640, 480))
+    
+    def create_recognition_worker(self):
+        if self.recognition_workers <= 1:
+            return RecognitionWorker(self.frame_scheduler, self.recognize_frame, pacer=self.pacer,
+                                     gate=self.frame_has_motion, on_error=self.recognition_failed)
+            
+        # The pool is kept across camera restarts; spawning workers is slow
+        if self.recognition_pool is None:
+            self.recognition_pool = RecognitionPool(workers=self.recognition_workers)
+        return PoolRecognitionWorker(self.frame_scheduler, self.recognition_pool, self.match_faces,
+                                     active=self.recognition_active,
+                                     options=lambda: self.engine.pool_options(self.pacer.detection_scale),
+                                     pacer=self.pacer, gate=self.frame_has_motion,
+                                     on_error=self.recognition_failed)
+    
+    def recognition_failed(self, error):
+        # Runs on the recognition worker, possibly for every frame: one
+        # dialog per camera run, the status bar for the rest
+        self.recognition_errors += 1
+        self.post_to_ui(self.show_recognition_error, self.recognition_errors, str(error))
+    
+    def show_recognition_error(self, errors, message):
+        if errors == 1:
+            messagebox.showerror("Recognition Error", f"Face recognition failed: {message}")
+        self.status_var.set(f"Recognition errors: {errors} (last: {message})")
+    
+    def recognition_active(self):
+        return self.attendance_running and len(self.gallery) > 0
+    
+    def frame_has_motion(self, packet):
+        # Runs on the recognition worker thread before any detection
+        gate = packet.source.motion_gate
+        if not self.recognition_active():
+            gate.reset()
+            return True
+        gate.min_area = self.motion_area
+        return gate.changed(packet.value)
+    
+    def recognize_frame(self, frame_rgb, source):
+        # Runs on the recognition worker thread
+        if self.recognition_active():
+            return self.process_faces(frame_rgb, source.state)
+        source.state.reset()
+        return []
+    
+    def post_to_ui(self, callback, *args):
+        self.ui_queue.put((callback, args))
+    
+    def process_ui_queue(self):
+        while True:
+            try:
+                callback, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                return
+            callback(*args)
+    
+    def pump_ui_queue(self):
+        self.process_ui_queue()
+        self.attendance_log.flush()
+        self.root.after(100, self.pump_ui_queue)
+    
     def update_video(self):
         if not self.running:
             return
             
-        ret, frame = self.video_capture.read()
-        if ret:
-            # Convert to RGB and resize for display
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame_rgb = cv2.resize(frame_rgb, (640, 480))
-            
-            # Face detection and recognition
-            if self.attendance_running and self.known_encodings:
-                self.process_faces(frame_rgb)
-            
-            # Convert to PhotoImage
-            img = Image.fromarray(frame_rgb)
-            imgtk = ImageTk.PhotoImage(image=img)
+        start = time.perf_counter()
+        self.process_ui_queue()
+        
+        for source in self.sources:
+            self.update_tile(source)
             
-            # Update the label
-            self.video_label.imgtk = imgtk
-            self.video_label.configure(image=imgtk)
+        # Sleep only what is left of this frame's slot, or longer while
+        # nothing moves in front of any camera
+        delay = self.pacer.display_delay(time.perf_counter() - start)
+        if self.recognition_active() and all(source.motion_gate.idle for source in self.sources):
+            delay = max(delay, 1000 // self.idle_display_fps)
+        self.root.after(delay, self.update_video)
+    
+    def update_rates(self):
+        if not self.running:
+            self.rate_var.set("")
+            return
+        display_fps, recognition_fps = self.pacer.rates()
+        self.rate_var.set(f"Display {display_fps:.1f} fps | Recognition {recognition_fps:.1f} fps | "
+                          f"Detection scale {self.pacer.detection_scale} | Detector {self.engine.detector}")
+        self.root.after(1000, self.update_rates)
+    
+    def set_detection_scale(self, scale):
+        self.detection_scale = scale
+        self.pacer.set_max_scale(scale)
+        if self.running and self.detector_choice == "auto":
+            self.calibrate_detector()
+    
+    def set_detector(self, choice):
+        if choice == "auto":
+            self.detector_choice = choice
+            if self.running:
+                self.calibrate_detector()
+            return
             
-        self.root.after(10, self.update_video)
-    
-    def process_faces(self, frame):
-        # Find all face locations and encodings in the current frame
-        face_locations = face_recognition.face_locations(frame)
-        face_encodings = face_recognition.face_encodings(frame, face_locations)
-        
-        for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-            # Compare with known faces
-            matches = face_recognition.compare_faces(
-                self.known_encodings, 
-                face_encoding,
-                tolerance=self.face_recognition_threshold
-            )
+        try:
+            get_detector(choice)
+        except (ImportError, OSError) as e:
+            messagebox.showerror("Detector Error", f"Could not load the {choice} detector: {str(e)}")
+            self.detector_combobox.set(self.detector_choice)
+            return
+        self.detector_choice = choice
+        self.engine.detector = choice
+    
+    def calibrate_detector(self):
+        # Calibration runs off the Tk thread on frames from the first
+        # source, at the resolution and scale recognition uses
+        threading.Thread(target=self.run_detector_calibration,
+                         args=(self.sources[0].frame_slot, self.pacer.detection_scale), daemon=True).start()
+        self.status_var.set("Calibrating detector...")
+    
+    def run_detector_calibration(self, slot, scale):
+        # Frames are sampled a little apart so they are not all the same
+        frames, seq = [], 0
+        deadline = time.monotonic() + 10.0
+        while self.running and len(frames) < self.calibration_frames and time.monotonic() < deadline:
+            packet = slot.latest()
+            if packet is not None and packet.seq > seq:
+                frames.append(packet.value)
+                seq = packet.seq
+            time.sleep(0.2)
+        if not frames:
+            return
             
-            face_distances = face_recognition.face_distance(self.known_encodings, face_encoding)
-            best_match_index = np.argmin(face_distances)
+        try:
+            chosen, report = calibrate(available_detectors(), frames, scale, self.detector_accuracy_floor)
+        except Exception as e:
+            self.post_to_ui(messagebox.showerror, "Detector Error", f"Detector calibration failed: {str(e)}")
+            return
+        self.post_to_ui(self.detector_calibrated, chosen, report)
+    
+    def detector_calibrated(self, chosen, report):
+        if self.detector_choice != "auto":
+            return
+        self.engine.detector = chosen
+        timings = ", ".join(f"{row['detector']} {row['detect_ms']:.1f} ms" for row in report)
+        self.status_var.set(f"Detector: {chosen} (auto; {timings})")
+    
+    def update_tile(self, source):
+        packet = source.frame_slot.latest()
+        if packet is None or packet.seq == source.last_shown_seq:
+            return
+        source.last_shown_seq = packet.seq
+        start = time.perf_counter()
+        
+        # The worker may still be reading this frame, so overlays go on the
+        # tile's own buffer, which is pasted into its persistent PhotoImage
+        result = source.result_slot.latest()
+        source.renderer.render(packet.value, result.value if result is not None else None, self.draw_faces)
+        metrics.STAGE_SECONDS.labels("render").observe(time.perf_counter() - start)
+    
+    def process_faces(self, frame, tracker):
+        # Full detection only runs every few frames or when a track is lost;
+        # in between, existing tracks are carried forward
+        if tracker.needs_detection():
+            face_locations = self.engine.detect(frame, self.pacer.detection_scale)
+            tracker.step(frame, face_locations)
+        else:
+            tracker.step(frame)
+        metrics.FACES_PER_FRAME.observe(len(tracker.tracks))
+        
+        # Only new or uncertain tracks go through the encoder
+        pending = tracker.pending_encoding()
+        if pending:
+            face_encodings = self.engine.encode(frame, [track.box for track in pending])
+            for track, (student, confidence) in zip(pending, self.identify_faces(face_encodings)):
+                tracker.assign(track, student, confidence)
+        
+        return [self.resolve_face(track.box, track.student, track.confidence) for track in tracker.tracks]
+    
+    def identify_faces(self, face_encodings):
+        # (student, confidence) per face; unknown faces have no confidence
+        return [(student, self.engine.confidence(distance)) if student is not None else (None, None)
+                for student, distance in self.engine.identify(face_encodings)]
+    
+    def match_faces(self, face_locations, face_encodings, source=None):
+        metrics.FACES_PER_FRAME.observe(len(face_locations))
+        return [self.resolve_face(face_location, student, confidence)
+                for face_location, (student, confidence) in zip(face_locations, self.identify_faces(face_encodings))]
+    
+    def resolve_face(self, face_location, student, confidence):
+        if student is None:
+            # Unknown face
+            return (face_location, None, None)
             
-            if matches[best_match_index]:
-                student = self.known_students[best_match_index]
-                confidence = 1 - face_distances[best_match_index]
-                
-                # Mark attendance if confidence is high enough
-                if confidence > self.face_recognition_threshold:
-                    self.mark_attendance(student)
-                    
-                    # Draw rectangle and info
-                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                    cv2.putText(frame, student['name'], (left, top - 10), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                    cv2.putText(frame, f"Confidence: {confidence:.2f}", (left, bottom + 20), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        # The engine only returns students it accepted (within threshold)
+        self.mark_attendance(student)
+        return (face_location, student, confidence)
+    
+    def draw_faces(self, frame, detections, scale=1.0):
+        import cv2
+        
+        for box, student, confidence in detections:
+            top, right, bottom, left = (int(v * scale) for v in box)
+            if student is not None:
+                # Draw rectangle and info
+                cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+                cv2.putText(frame, student['name'], (left, top - 10), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+                cv2.putText(frame, f"Confidence: {confidence:.2f}", (left, bottom + 20), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
             else:
-                # Unknown face
                 cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
                 cv2.putText(frame, "Unknown", (left, top - 10), 
                             cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
     
+    def load_attendance_day(self, day):
+        rows = self.storage.fetchall(
+            "SELECT student_id, time_in, time_out FROM attendance WHERE date = %s",
+            (day,)
+        )
+        return [(row['student_id'], row['time_in'], row['time_out']) for row in rows]
+    
     def mark_attendance(self, student):
-        today = datetime.now().date()
-        
+        # Called from the recognition worker, so Tk updates go via the UI queue
         try:
-            # Check if attendance already marked today
-            self.cursor.execute(
-                "SELECT * FROM attendance WHERE student_id = %s AND date = %s",
-                (student['student_id'], today)
-            )
-            existing = self.cursor.fetchone()
-            
-            if existing:
-                # Update time_out if exists
-                if not existing['time_out']:
-                    self.cursor.execute(
-                        "UPDATE attendance SET time_out = %s WHERE attendance_id = %s",
-                        (datetime.now(), existing['attendance_id'])
-                    )
-                    self.add_to_log(student['name'], "Checked Out")
-            else:
-                # Insert new attendance record
-                self.cursor.execute(
-                    """INSERT INTO attendance 
-                    (student_id, date, time_in, status) 
-                    VALUES (%s, %s, %s, %s)""",
-                    (student['student_id'], today, datetime.now(), "Present")
-                )
-                self.add_to_log(student['name'], "Checked In")
-                
+            with metrics.STAGE_SECONDS.labels("attendance").time():
+                event = self.attendance_state.record(student['student_id'])
         except Exception as e:
-            messagebox.showerror("Database Error", f"Failed to mark attendance: {str(e)}")
-    
-    def add_to_log(self, name, status):
-        current_time = datetime.now().strftime("%H:%M:%S")
-        self.attendance_tree.insert("", tk.END, values=(name, current_time, status))
-        
-        # Auto-scroll to the bottom
-        self.attendance_tree.yview_moveto(1)
+            self.post_to_ui(messagebox.showerror, "Database Error", f"Failed to mark attendance: {str(e)}")
+            return
+            
+        if event is not None:
+            self.attendance_writer.submit(event)
+            self.attendance_log.append(student['name'], event.kind, event.timestamp)
     
     def on_closing(self):
         self.stop_attendance()
         self.stop_camera()
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
+        if self.recognition_pool is not None:
+            self.recognition_pool.close()
+        self.engine.close()
+        
+        # Flush pending attendance before the connection goes away
+        self.gallery_sync.stop()
+        self.attendance_writer.close()
+        
+        # Refresh the gallery snapshot if students were added this session
+        if self.storage and self.roster_state is not None:
+            try:
+                roster_state = self.fetch_roster_state()
+                if roster_state != self.roster_state:
+                    self.save_gallery_snapshot(roster_state)
+            except Exception:
+                pass
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        if self.storage:
+            self.storage.close()
         self.root.destroy()
 
 if __name__ == "__main__":
@@ -0,0 +1,369 @@
+import copy
+import json
+import os
+import threading
+
+import numpy as np
+
+from encoding_format import STORAGE_DTYPES, dequantize, quantize, unpack
+
+# Bump when the snapshot layout changes; older snapshots are ignored
+SNAPSHOT_VERSION = 2
+SNAPSHOT_FIELDS = ("student_id", "name", "age", "gender", "email", "phone", "image_path")
+# An attached index is retrained once the gallery grows to this multiple of
+# the rows it was trained on; cells (or the LSH centre) fitted to a small
+# roster would otherwise turn every query into a near-full scan
+RETRAIN_GROWTH = 4
+
+
+class FaceGallery:
+    # precision="float16" or "int8" keeps the matrix in that compact form
+    # (4x / 7x smaller than float64). Those are scanned in float32 a block
+    # at a time and the `rerank` nearest rows are then scored exactly in
+    # float64, so only distances near the cut can be off
+    def __init__(self, dim=128, capacity=1024, precision="float64", rerank=16):
+        self.dim = dim
+        self.precision = precision
+        self.rerank = rerank
+        self.size = 0
+        self.students = []
+        self.index = None
+        self._rows = {}  # student_id -> row
+
+        # One contiguous matrix for every registered encoding, plus the
+        # squared norms so a whole frame can be scored with one matmul.
+        # int8 rows also carry a scale; it stays 1 for the float formats
+        self._encodings = np.empty((capacity, dim), dtype=STORAGE_DTYPES[precision])
+        self._scales = np.ones(capacity, dtype=np.float32)
+        self._sq_norms = np.empty(capacity, dtype=np.float64)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def encodings(self):
+        # float64 rows; a copy unless the gallery itself is float64
+        return self._decode(slice(0, self.size))
+
+    @property
+    def nbytes(self):
+        return self._encodings[:self.size].nbytes + self._scales[:self.size].nbytes + self._sq_norms[:self.size].nbytes
+
+    def encoding(self, row):
+        return self._decode(slice(row, row + 1))[0]
+
+    def same_encoding(self, row, encoding):
+        # Compares in the stored precision, so a float64 vector and its
+        # compact copy count as equal
+        codes, scales = quantize(np.asarray(encoding, dtype=np.float64).reshape(1, self.dim), self.precision)
+        return np.array_equal(self._encodings[row], codes[0]) and self._scales[row] == scales[0]
+
+    def _decode(self, rows):
+        if self.precision == "float64":
+            return self._encodings[rows]
+        return dequantize(self._encodings[rows], self._scales[rows])
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        capacity = self._encodings.shape[0]
+        # A memory-mapped snapshot is read-only, so the first add copies it
+        if needed <= capacity and self._encodings.flags.writeable:
+            return
+
+        capacity = max(capacity, 16)
+        while capacity < needed:
+            capacity *= 2
+
+        encodings = np.empty((capacity, self.dim), dtype=self._encodings.dtype)
+        scales = np.ones(capacity, dtype=np.float32)
+        sq_norms = np.empty(capacity, dtype=np.float64)
+        encodings[:self.size] = self._encodings[:self.size]
+        scales[:self.size] = self._scales[:self.size]
+        sq_norms[:self.size] = self._sq_norms[:self.size]
+        self._encodings = encodings
+        self._scales = scales
+        self._sq_norms = sq_norms
+
+    def add(self, encoding, student):
+        self.add_many([encoding], [student])
+
+    def add_many(self, encodings, students):
+        # A student_id already in the gallery is overwritten in place, so
+        # the same row arriving from both GallerySync and a local enrollment
+        # is never held twice
+        encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, self.dim)
+        if len(encodings) != len(students):
+            raise ValueError("Each encoding needs exactly one student record")
+        # Norms (and the index) describe the vectors as stored
+        codes, scales = quantize(encodings, self.precision)
+        encodings = dequantize(codes, scales)
+
+        with self._lock:
+            start = end = self.size
+            targets = []
+            for student in students:
+                student_id = student.get('student_id')
+                row = self._rows.get(student_id) if student_id is not None else None
+                if row is None:
+                    row = end
+                    end += 1
+                    if student_id is not None:
+                        self._rows[student_id] = row
+                targets.append(row)
+
+            self._reserve(end - start)
+            targets = np.asarray(targets, dtype=np.int64)
+            self._encodings[targets] = codes
+            self._scales[targets] = scales
+            self._sq_norms[targets] = np.einsum("ij,ij->i", encodings, encodings)
+            self.students.extend([None] * (end - start))
+            for row, student in zip(targets, students):
+                self.students[row] = student
+            self.size = end
+            index = self.index
+            if index is not None:
+                index.add(self._decode(slice(start, end)), start)
+        # An index attached to an empty gallery is trained on the first rows
+        if index is not None and (not index.is_trained or np.any(targets < start) or
+                                  end >= RETRAIN_GROWTH * index.trained_size):
+            self._rebuild_index(index)
+
+    def replace(self, row, encoding, student):
+        self.replace_many([row], [encoding], [student])
+
+    def replace_many(self, rows, encodings, students):
+        # Re-enrolled students: overwrite their rows in place
+        codes, scales = quantize(np.asarray(encodings, dtype=np.float64).reshape(-1, self.dim), self.precision)
+        encodings = dequantize(codes, scales)
+        rows = np.asarray(rows, dtype=np.int64)
+        with self._lock:
+            self._reserve(0)
+            self._encodings[rows] = codes
+            self._scales[rows] = scales
+            self._sq_norms[rows] = np.einsum("ij,ij->i", encodings, encodings)
+            for row, student in zip(rows, students):
+                self.students[row] = student
+            index = self.index
+        if index is not None and len(rows):
+            self._rebuild_index(index)
+
+    def _rebuild_index(self, index):
+        # Index cells can not move single points, so a changed row means a
+        # rebuild. It runs on a copy outside the lock, so match() keeps
+        # using the old index meanwhile, and is swapped in afterwards. Rows
+        # appended in between are added to the copy; if the index was
+        # replaced or dropped meanwhile, this rebuild is stale and discarded
+        size, encodings = self._index_rows()
+        rebuilt = copy.copy(index)
+        rebuilt.build(encodings)
+        with self._lock:
+            if self.index is not index:
+                return
+            if self.size > size:
+                rebuilt.add(self._decode(slice(size, self.size)), size)
+            self.index = rebuilt
+
+    def _index_rows(self):
+        # A private copy of the rows, to train an index on without the lock
+        with self._lock:
+            return self.size, np.array(self._decode(slice(0, self.size)))
+
+    def row_of(self, student_id):
+        return self._rows.get(student_id)
+
+    def clear(self):
+        with self._lock:
+            self.size = 0
+            self.students = []
+            self._rows = {}
+            self.index = None
+
+    def load_students(self, students):
+        # Rows from the students table; face_encoding is any stored format
+        encodings = []
+        known_students = []
+        for student in students:
+            if student['face_encoding']:
+                encodings.append(unpack(student['face_encoding'], self.dim))
+                known_students.append(student)
+
+        self.clear()
+        self.add_many(encodings, known_students)
+
+    def load_arrays(self, encodings, sq_norms, students, scales=None):
+        # Adopts the arrays as-is (e.g. np.load(..., mmap_mode="r")) so
+        # pages are only read from disk when matching touches them
+        if encodings.dtype != STORAGE_DTYPES[self.precision]:
+            raise ValueError(f"Expected {self.precision} encodings, got {encodings.dtype}")
+        with self._lock:
+            self._encodings = encodings
+            self._scales = np.ones(len(encodings), dtype=np.float32) if scales is None else scales
+            self._sq_norms = sq_norms
+            self.students = list(students)
+            self._rows = {student.get('student_id'): row for row, student in enumerate(self.students)}
+            self.size = len(self.students)
+            self.index = None
+
+    def student_ids(self):
+        return [student.get('student_id') for student in self.students[:self.size]]
+
+    def set_index(self, index):
+        # An approximate index narrows each query to a candidate set; the
+        # candidates are still ranked by exact distance below. Set on an
+        # empty gallery, it is trained once rows are added. Training runs
+        # outside the lock, so matching carries on with the old index
+        size = None
+        if index is not None and (not index.is_trained or len(index) != self.size):
+            size, encodings = self._index_rows()
+            index.build(encodings)
+        with self._lock:
+            if size is not None and self.size > size:
+                index.add(self._decode(slice(size, self.size)), size)
+            self.index = index
+
+    def snapshot(self):
+        # Views stay valid after a later grow because _reserve reallocates
+        with self._lock:
+            n = self.size
+            return self._encodings[:n], self._scales[:n], self._sq_norms[:n], self.students[:n]
+
+    def distances(self, face_encodings):
+        encodings, scales, sq_norms, _ = self.snapshot()
+        faces = np.asarray(face_encodings, dtype=np.float64).reshape(-1, self.dim)
+        if self.precision == "float64":
+            return self._distances(faces, encodings, sq_norms)
+        return self._scan(faces, encodings, scales, sq_norms)
+
+    @staticmethod
+    def _distances(faces, encodings, sq_norms):
+        # ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b for every (face, gallery) pair
+        face_sq = np.einsum("ij,ij->i", faces, faces)
+        sq = face_sq[:, None] + sq_norms[None, :] - 2.0 * (faces @ encodings.T)
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq, out=sq)
+
+    @staticmethod
+    def _scan(faces, codes, scales, sq_norms, block=4096):
+        # Same formula straight off the compact rows: each block is widened
+        # to float32 for one BLAS call, so no float copy of the whole
+        # gallery is ever made
+        faces = faces.astype(np.float32)
+        sq = np.empty((len(faces), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), block):
+            end = min(start + block, len(codes))
+            np.matmul(faces, codes[start:end].astype(np.float32).T, out=sq[:, start:end])
+            sq[:, start:end] *= scales[start:end]
+        sq *= -2.0
+        sq += np.einsum("ij,ij->i", faces, faces)[:, None]
+        sq += sq_norms.astype(np.float32)[None, :]
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq, out=sq)
+
+    def match(self, face_encodings, k=1, tolerance=None, exact=False):
+        with self._lock:
+            n = self.size
+            encodings, scales, sq_norms = self._encodings[:n], self._scales[:n], self._sq_norms[:n]
+            students = self.students[:n]
+            index = None if exact else self.index
+            faces = np.asarray(face_encodings, dtype=np.float64).reshape(-1, self.dim)
+            if index is not None and not index.is_trained:
+                index = None
+            candidates = index.candidates(faces) if index is not None and len(faces) and n else None
+
+        if not len(faces):
+            return []
+        if not n:
+            return [[] for _ in range(len(faces))]
+
+        if candidates is None and self.precision == "float64":
+            distances = self._distances(faces, encodings, sq_norms)
+            return [self._top_k(row, None, k, tolerance, students) for row in distances]
+
+        if candidates is None:
+            # Shortlist on the compact rows, then re-rank exactly
+            shortlist = min(n, max(k, self.rerank))
+            approximate = self._scan(faces, encodings, scales, sq_norms)
+            if shortlist < n:
+                candidates = np.argpartition(approximate, shortlist - 1, axis=1)[:, :shortlist]
+            else:
+                candidates = np.broadcast_to(np.arange(n), (len(faces), n))
+
+        results = []
+        for face, rows in zip(faces, candidates):
+            rows = rows[rows < n]
+            found = encodings[rows] if self.precision == "float64" else dequantize(encodings[rows], scales[rows])
+            distances = self._distances(face[None, :], found, sq_norms[rows])[0]
+            results.append(self._top_k(distances, rows, k, tolerance, students))
+        return results
+
+    @staticmethod
+    def _top_k(distances, rows, k, tolerance, students):
+        k = min(k, len(distances))
+        if not k:
+            return []
+
+        # Partial sort, then order only the k survivors
+        if k < len(distances):
+            top = np.argpartition(distances, k - 1)[:k]
+            top = top[np.argsort(distances[top])]
+        else:
+            top = np.argsort(distances)
+
+        matches = []
+        for position in top:
+            distance = float(distances[position])
+            if tolerance is not None and distance > tolerance:
+                break
+            index = position if rows is None else rows[position]
+            matches.append((students[index], distance))
+        return matches
+
+
+def _replace_atomically(path, write):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def save_snapshot(gallery, prefix, roster_state):
+    # <prefix>.npy holds the encodings, <prefix>.norms.npy their squared
+    # norms and <prefix>.json the student records plus the (row count,
+    # max student_id, newest registration_date) of the table they were read
+    # from; <prefix>.scales.npy the int8 row scales. The JSON is written last, so a torn write only
+    # ever leaves a stale snapshot
+    encodings, scales, sq_norms, students = gallery.snapshot()
+    _replace_atomically(f"{prefix}.npy", lambda f: np.save(f, np.ascontiguousarray(encodings)))
+    _replace_atomically(f"{prefix}.scales.npy", lambda f: np.save(f, np.ascontiguousarray(scales)))
+    _replace_atomically(f"{prefix}.norms.npy", lambda f: np.save(f, np.ascontiguousarray(sq_norms)))
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "precision": gallery.precision,
+        "roster_state": list(roster_state),
+        "students": [{field: student.get(field) for field in SNAPSHOT_FIELDS} for student in students],
+    }
+    _replace_atomically(f"{prefix}.json", lambda f: f.write(json.dumps(meta, default=str).encode()))
+
+
+def load_snapshot(gallery, prefix, roster_state):
+    # Returns False (leaving the gallery untouched) unless the snapshot was
+    # taken from a table in the same state
+    try:
+        with open(f"{prefix}.json", "rb") as f:
+            meta = json.loads(f.read())
+        if meta.get("version") != SNAPSHOT_VERSION or meta.get("roster_state") != list(roster_state) or \
+                meta.get("precision") != gallery.precision:
+            return False
+        encodings = np.load(f"{prefix}.npy", mmap_mode="r")
+        scales = np.load(f"{prefix}.scales.npy", mmap_mode="r")
+        sq_norms = np.load(f"{prefix}.norms.npy", mmap_mode="r")
+    except (OSError, ValueError):
+        return False
+
+    students = meta["students"]
+    if encodings.shape != (len(students), gallery.dim) or sq_norms.shape != (len(students),) or \
+            scales.shape != (len(students),) or encodings.dtype != STORAGE_DTYPES[gallery.precision]:
+        return False
+    gallery.load_arrays(encodings, sq_norms, students, scales)
+    return True
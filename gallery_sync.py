@@ -0,0 +1,126 @@
+import threading
+
+from encoding_format import unpack
+
+STUDENT_COLUMNS = "student_id, name, age, gender, email, phone, image_path, face_encoding, registration_date"
+
+
+def newest_registration(storage):
+    # (ORDER BY rather than MAX so SQLite still converts the column)
+    row = storage.fetchone("SELECT registration_date FROM students ORDER BY registration_date DESC LIMIT 1")
+    return row['registration_date'] if row else None
+
+
+class GallerySync(threading.Thread):
+    # Polls the students table for rows enrolled at other kiosks (student_id
+    # past the newest one seen) or re-enrolled since the last poll (newer
+    # registration_date) and applies only those to the gallery, so the
+    # video loop never waits on a full reload. `on_update(added, replaced)`
+    # runs on this thread after each poll that changed something.
+    # last_date is the newest registration_date when the gallery was
+    # loaded; read it before the load so nothing enrolled meanwhile is
+    # missed. Without it the table is asked when the sync is created
+    def __init__(self, storage, gallery, interval=30.0, batch_size=500, on_update=None, on_error=None,
+                 last_date=None):
+        super().__init__(daemon=True)
+        self.storage = storage
+        self.gallery = gallery
+        self.interval = interval
+        self.batch_size = batch_size
+        self.on_update = on_update
+        self.on_error = on_error
+        self.last_id = max((i for i in gallery.student_ids() if i is not None), default=0)
+        if last_date is None and len(gallery):
+            last_date = newest_registration(storage)
+        self.last_date = last_date
+        self._applied = {}  # student_id -> registration_date, for rows at last_date
+        self.polls = 0
+        self.last_error = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                added, replaced = self.poll()
+            except Exception as e:
+                self.last_error = e
+                if self.on_error is not None:
+                    self.on_error(e)
+                continue
+            if (added or replaced) and self.on_update is not None:
+                self.on_update(added, replaced)
+
+    def poll(self):
+        self.polls += 1
+
+        added = 0
+        since_id, since_date = self.last_id, self.last_date
+        replaced_rows, replaced_encodings, replaced_students = [], [], []
+        after_id = 0
+        while True:
+            rows = self._fetch(since_id, since_date, after_id)
+            new_encodings, new_students = [], []
+            for student in rows:
+                after_id = student['student_id']
+                if self._applied.get(student['student_id']) == student['registration_date'] and \
+                        student['student_id'] <= since_id:
+                    continue
+                self._advance(student)
+                if not student['face_encoding']:
+                    continue
+
+                encoding = unpack(student['face_encoding'], self.gallery.dim)
+                row = self.gallery.row_of(student['student_id'])
+                if row is None:
+                    new_encodings.append(encoding)
+                    new_students.append(student)
+                elif not self.gallery.same_encoding(row, encoding):
+                    replaced_rows.append(row)
+                    replaced_encodings.append(encoding)
+                    replaced_students.append(student)
+
+            # One append (and one index update) per page
+            if new_students:
+                self.gallery.add_many(new_encodings, new_students)
+                added += len(new_students)
+            if len(rows) < self.batch_size:
+                break
+
+        # Every re-enrolled row is written at once, so an attached index is
+        # rebuilt once per poll rather than once per row
+        if replaced_rows:
+            self.gallery.replace_many(replaced_rows, replaced_encodings, replaced_students)
+        return added, len(replaced_rows)
+
+    def _fetch(self, since_id, since_date, after_id):
+        # Pages are keyed on student_id. registration_date uses >= because
+        # several rows can share the last second; rows already applied at
+        # that timestamp are skipped by the caller
+        if since_date is None:
+            return self.storage.fetchall(
+                f"""SELECT {STUDENT_COLUMNS} FROM students
+                WHERE student_id > %s AND student_id > %s ORDER BY student_id LIMIT %s""",
+                (since_id, after_id, self.batch_size)
+            )
+        return self.storage.fetchall(
+            f"""SELECT {STUDENT_COLUMNS} FROM students
+            WHERE (student_id > %s OR registration_date >= %s) AND student_id > %s
+            ORDER BY student_id LIMIT %s""",
+            (since_id, since_date, after_id, self.batch_size)
+        )
+
+    def _advance(self, student):
+        self.last_id = max(self.last_id, student['student_id'])
+        registration_date = student['registration_date']
+        if registration_date is None:
+            return
+        if self.last_date is None or registration_date > self.last_date:
+            self.last_date = registration_date
+            self._applied = {}
+        if registration_date == self.last_date:
+            self._applied[student['student_id']] = registration_date
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
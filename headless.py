@@ -0,0 +1,276 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import cv2
+
+import metrics
+from attendance import AttendanceState, AttendanceWriter
+from detectors import DETECTOR_TYPES, available_detectors, calibrate
+from encoding_format import PRECISIONS
+from engine import RecognitionEngine
+from gallery_sync import GallerySync
+from motion import MotionGate
+from recognition_pool import RecognitionPool
+from recording import FrameRecorder, RecordingCapture, ReplayCapture
+from storage import open_storage
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def open_source(camera=None, video=None, images=None, replay=None, realtime=False, record=None):
+    if images is not None:
+        return image_frames(images), f"images:{images}"
+    if replay is not None:
+        video_capture, name = ReplayCapture(replay, realtime=realtime), f"replay:{replay}"
+    elif video is not None:
+        video_capture, name = cv2.VideoCapture(video), f"video:{video}"
+    else:
+        video_capture, name = cv2.VideoCapture(camera or 0), f"camera:{camera or 0}"
+    if record is not None:
+        video_capture = RecordingCapture(video_capture, FrameRecorder(record, source=name))
+    return capture_frames(video_capture), name
+
+
+def capture_frames(video_capture):
+    if not video_capture.isOpened():
+        raise RuntimeError("Could not open video source")
+    try:
+        while True:
+            ret, frame = video_capture.read()
+            if not ret:
+                return
+            yield frame
+    finally:
+        video_capture.release()
+
+
+def image_frames(directory):
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        frame = cv2.imread(os.path.join(directory, name))
+        if frame is not None:
+            yield frame
+
+
+def prepared_frames(frames, stride, size, max_frames):
+    # Same preparation as update_video: RGB, resized to the display size
+    for index, frame in enumerate(frames):
+        if max_frames is not None and index >= max_frames * stride:
+            return
+        if index % stride:
+            continue
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        yield index, cv2.resize(frame_rgb, size)
+
+
+def gated_frames(frames, gate):
+    # Drops frames the motion gate considers static
+    for index, frame in frames:
+        if gate.changed(frame):
+            yield index, frame
+
+
+def choose_detector(frames, scale, accuracy_floor, count=10):
+    # Calibrates on the first frames; returns the chosen backend and the
+    # frames with the sampled ones put back in front
+    sample = list(itertools.islice(frames, count))
+    chosen, report = calibrate(available_detectors(), [frame for _, frame in sample], scale, accuracy_floor)
+    for row in report:
+        f1 = "n/a" if row['f1'] is None else f"{row['f1']:.2f}"
+        print(f"detector {row['detector']}: {row['detect_ms']:.1f} ms, f1 {f1}", file=sys.stderr)
+    print(f"using detector {chosen}", file=sys.stderr)
+    return chosen, itertools.chain(sample, frames)
+
+
+def recognize(frames, workers, engine):
+    # Yields (frame index, recognitions) in frame order
+    if workers <= 1:
+        for index, frame in frames:
+            with metrics.STAGE_SECONDS.labels("recognize").time():
+                recognitions = engine.recognize(frame)
+            yield index, recognitions
+        return
+
+    # The first frame sizes the shared-memory buffers
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        return
+    with RecognitionPool(workers=workers, frame_bytes=first[1].nbytes, **engine.pool_options()) as pool:
+        pool.submit(first[1], tag=first[0])
+        for index, frame in frames:
+            while not pool.has_capacity():
+                tag, (face_locations, face_encodings) = pool.next_result()
+                yield tag, engine.match(face_locations, face_encodings)
+            pool.submit(frame, tag=index)
+        for tag, (face_locations, face_encodings) in pool.results():
+            yield tag, engine.match(face_locations, face_encodings)
+
+
+class RecognitionDaemon:
+    def __init__(self, storage, threshold=0.6, events_out=None, write_attendance=False, flush_interval=1.0,
+                 sync_interval=None, precision="int8", detector="hog", scale=1.0):
+        self.storage = storage
+        self.events_out = events_out
+        self.engine = RecognitionEngine(detector=detector, threshold=threshold, scale=scale, precision=precision)
+        # Only what matching, the JSON events and GallerySync need
+        students = storage.fetchall("SELECT student_id, name, face_encoding, registration_date FROM students")
+        self.engine.load_students(students)
+        self.gallery = self.engine.gallery
+
+        self.gallery_sync = None
+        if sync_interval:
+            last_date = max((s['registration_date'] for s in students if s['registration_date'] is not None),
+                            default=None)
+            self.gallery_sync = GallerySync(storage, self.gallery, interval=sync_interval, last_date=last_date)
+            self.gallery_sync.start()
+
+        self.attendance_state = None
+        self.attendance_writer = None
+        if write_attendance:
+            self.attendance_state = AttendanceState(loader=self.load_attendance_day)
+            self.attendance_writer = AttendanceWriter(
+                storage, flush_interval=flush_interval,
+                on_error=lambda e: print(f"failed to save attendance, retrying: {e}", file=sys.stderr),
+                on_recover=lambda failures: print(f"attendance saving resumed after {failures} failures",
+                                                  file=sys.stderr),
+                unsent_path=os.path.join(storage.data_dir, "unsent_attendance.jsonl"))
+            self.attendance_writer.start()
+
+        self.frames = 0
+        self.faces = 0
+        self.matches = 0
+        self.unknown = 0
+
+    def load_attendance_day(self, day):
+        rows = self.storage.fetchall(
+            "SELECT student_id, time_in, time_out FROM attendance WHERE date = %s",
+            (day,)
+        )
+        return [(row['student_id'], row['time_in'], row['time_out']) for row in rows]
+
+    def handle(self, source, index, recognitions):
+        self.frames += 1
+        self.faces += len(recognitions)
+        metrics.FACES_PER_FRAME.observe(len(recognitions))
+        now = datetime.now()
+        for face_location, student, distance in recognitions:
+            event_kind = None
+            if student is None:
+                self.unknown += 1
+            else:
+                self.matches += 1
+                if self.attendance_state is not None:
+                    event = self.attendance_state.record(student['student_id'], now)
+                    if event is not None:
+                        self.attendance_writer.submit(event)
+                        event_kind = event.kind
+
+            if self.events_out is not None:
+                self.events_out.write(json.dumps({
+                    "source": source,
+                    "frame": index,
+                    "timestamp": now.isoformat(),
+                    "box": list(face_location),
+                    "student_id": student['student_id'] if student else None,
+                    "name": student['name'] if student else None,
+                    "distance": distance,
+                    "attendance": event_kind,
+                }) + "\n")
+
+    def close(self):
+        if self.gallery_sync is not None:
+            self.gallery_sync.stop()
+        self.engine.close()
+        if self.attendance_writer is not None:
+            self.attendance_writer.close()
+        if self.events_out is not None:
+            self.events_out.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless face recognition over a camera, video file or image folder")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--camera", type=int, help="Camera index (default 0)")
+    source.add_argument("--video", help="Video file to process")
+    source.add_argument("--images", help="Directory of images to process")
+    source.add_argument("--replay", help="Frame recording (.frec) to play back")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Replay at the recorded frame timing instead of as fast as possible")
+    parser.add_argument("--record", help="Record the camera or video frames to this .frec file")
+    parser.add_argument("--stride", type=int, default=1, help="Process every Nth frame")
+    parser.add_argument("--workers", type=int, default=1, help="Recognition processes (1 = in-process)")
+    parser.add_argument("--scale", type=float, default=0.5, help="Detection scale")
+    parser.add_argument("--detector", choices=["auto"] + list(DETECTOR_TYPES), default="hog",
+                        help="Detector backend; auto calibrates on the first frames")
+    parser.add_argument("--accuracy-floor", type=float, default=0.8,
+                        help="Minimum F1 against HOG for --detector auto")
+    parser.add_argument("--motion-area", type=float, default=0.0,
+                        help="Skip frames where less than this percentage of the frame changed (0 = off)")
+    parser.add_argument("--motion-cooldown", type=float, default=2.0,
+                        help="Seconds to keep recognising after the last motion")
+    parser.add_argument("--threshold", type=float, default=0.6, help="Maximum match distance")
+    parser.add_argument("--size", type=int, nargs=2, default=[640, 480], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--max-frames", type=int, help="Stop after this many processed frames")
+    parser.add_argument("--jsonl", help="Write match events as JSON lines to this file ('-' for stdout)")
+    parser.add_argument("--attendance", action="store_true", help="Record attendance in the database")
+    parser.add_argument("--backend", choices=["mysql", "sqlite"], help="Storage backend (default from environment)")
+    parser.add_argument("--db-path", help="SQLite database file")
+    parser.add_argument("--precision", choices=PRECISIONS, default="int8", help="In-memory gallery precision")
+    parser.add_argument("--sync-interval", type=float, help="Poll for newly enrolled students every N seconds")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this localhost port")
+    args = parser.parse_args(argv)
+
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+
+    storage = open_storage(args.backend, args.db_path, host="localhost", user="root",
+                           password="lashchou", database="attendance_db")
+    storage.create_tables()
+    events_out = None
+    if args.jsonl == "-":
+        events_out = sys.stdout
+    elif args.jsonl:
+        events_out = open(args.jsonl, "a")
+
+    daemon = RecognitionDaemon(storage, args.threshold, events_out, args.attendance,
+                               sync_interval=args.sync_interval, precision=args.precision, scale=args.scale)
+    frames, source_name = open_source(args.camera, args.video, args.images, args.replay, args.realtime, args.record)
+    frames = prepared_frames(frames, max(1, args.stride), tuple(args.size), args.max_frames)
+    gate = None
+    if args.motion_area > 0:
+        gate = MotionGate(args.motion_area / 100, cooldown=args.motion_cooldown, source=source_name)
+        frames = gated_frames(frames, gate)
+    if args.detector == "auto":
+        daemon.engine.detector, frames = choose_detector(frames, args.scale, args.accuracy_floor)
+    else:
+        daemon.engine.detector = args.detector
+
+    start = time.perf_counter()
+    try:
+        for index, recognitions in recognize(frames, args.workers, daemon.engine):
+            daemon.handle(source_name, index, recognitions)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        elapsed = time.perf_counter() - start
+        daemon.close()
+        if events_out is not None and events_out is not sys.stdout:
+            events_out.close()
+        storage.close()
+
+    fps = daemon.frames / elapsed if elapsed else 0.0
+    print(f"{fps:.2f} fps ({daemon.frames} frames in {elapsed:.1f}s, {daemon.faces} faces, "
+          f"{daemon.matches} matched, {daemon.unknown} unknown)", file=sys.stderr)
+    if gate is not None:
+        print(f"motion gate skipped {gate.skipped} of {gate.checks} frames", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
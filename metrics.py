@@ -0,0 +1,262 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        key = tuple(values) or tuple(str(kwargs[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _series(self):
+        if not self.labelnames:
+            return [((), self.labels())]
+        return sorted(self._children.items())
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def render(self):
+        return [f"{self.name}{self._label_text(key)} {child.value}" for key, child in self._series()]
+
+    def snapshot(self):
+        return {self._label_text(key) or "value": child.value for key, child in self._series()}
+
+
+class _GaugeValue:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        # Read lazily at scrape time, e.g. a queue length
+        self.function = function
+
+    def get(self):
+        return float(self.function()) if self.function is not None else self.value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+    def render(self):
+        return [f"{self.name}{self._label_text(key)} {child.get()}" for key, child in self._series()]
+
+    def snapshot(self):
+        return {self._label_text(key) or "value": child.get() for key, child in self._series()}
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q):
+        # Linear interpolation inside the bucket holding the q-th sample
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def render(self):
+        lines = []
+        for key, child in self._series():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f"{self.name}_bucket{self._label_text(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {child.sum}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {child.count}")
+        return lines
+
+    def snapshot(self):
+        result = {}
+        for key, child in self._series():
+            result[self._label_text(key) or "value"] = {
+                "count": child.count,
+                "mean": child.sum / child.count if child.count else 0.0,
+                "p50": child.quantile(0.5),
+                "p95": child.quantile(0.95),
+                "p99": child.quantile(0.99),
+            }
+        return result
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, help_text, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get(Counter, name, help_text, labelnames=labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get(Gauge, name, help_text, labelnames=labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, labelnames=labelnames, buckets=buckets)
+
+    def render_prometheus(self):
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in sorted(self._metrics.values(), key=lambda m: m.name)}
+
+
+REGISTRY = Registry()
+
+# Metrics shared by the capture, recognition and attendance paths
+FRAMES_CAPTURED = REGISTRY.counter("facerec_frames_captured_total", "Frames read from the camera", ["source"])
+FRAMES_DROPPED = REGISTRY.counter("facerec_frames_dropped_total",
+                                  "Captured frames overwritten before recognition saw them", ["source"])
+STAGE_SECONDS = REGISTRY.histogram("facerec_stage_seconds", "Latency of each pipeline stage", ["stage"])
+FRAME_LATENCY = REGISTRY.histogram("facerec_frame_latency_seconds",
+                                   "Capture-to-result latency of recognised frames")
+FACES_PER_FRAME = REGISTRY.histogram("facerec_faces_per_frame", "Faces found per recognised frame",
+                                     buckets=COUNT_BUCKETS)
+MATCHES = REGISTRY.counter("facerec_matches_total", "Faces matched to a registered student")
+UNKNOWN_FACES = REGISTRY.counter("facerec_unknown_faces_total", "Faces that matched no student")
+DB_WRITE_SECONDS = REGISTRY.histogram("facerec_db_write_seconds", "Latency of attendance batch writes")
+DB_EVENTS_WRITTEN = REGISTRY.counter("facerec_db_events_written_total", "Attendance events written")
+RECOGNITION_ERRORS = REGISTRY.counter("facerec_recognition_errors_total", "Frames whose recognition raised",
+                                      ["stage"])
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1", registry=REGISTRY):
+    # Serves /metrics on localhost from a daemon thread; call shutdown() to stop
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
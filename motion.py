@@ -0,0 +1,77 @@
+import time
+
+import numpy as np
+
+import metrics
+
+MOTION_CHECKS = metrics.REGISTRY.counter("facerec_motion_checks_total", "Frames checked by the motion gate",
+                                         ["source"])
+DETECTIONS_SKIPPED = metrics.REGISTRY.counter("facerec_detections_skipped_total",
+                                              "Frames not recognised because the scene was static", ["source"])
+SECONDS_SAVED = metrics.REGISTRY.counter("facerec_recognition_seconds_saved_total",
+                                         "Estimated recognition time saved by the motion gate", ["source"])
+
+
+class MotionGate:
+    # Compares a small grayscale copy of each frame with a slowly updated
+    # background. A frame counts as motion when more than `min_area` of its
+    # pixels differ from the background by over `threshold` grey levels.
+    # Detection stays on for `cooldown` seconds after the last motion, so
+    # someone who stops in front of the camera is still picked up.
+    # min_area=0 lets every frame through. `cost` returns what recognising
+    # one frame costs right now and feeds the seconds-saved metric
+    def __init__(self, min_area=0.01, threshold=25, cooldown=2.0, size=(80, 60), learning_rate=0.05,
+                 source="camera", cost=None):
+        self.min_area = min_area
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.size = size
+        self.learning_rate = learning_rate
+        self.cost = cost
+        self.last_change = 0.0
+        self.idle = False
+        self.checks = 0
+        self.skipped = 0
+        self._small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self._gray = np.empty((size[1], size[0]), dtype=np.uint8)
+        self._background = None
+        self._last_motion = None
+        self._checks = MOTION_CHECKS.labels(source)
+        self._skipped = DETECTIONS_SKIPPED.labels(source)
+        self._saved = SECONDS_SAVED.labels(source)
+
+    def reset(self):
+        self._background = None
+        self._last_motion = None
+        self.idle = False
+
+    def changed(self, frame, now=None):
+        # True when the frame should go on to detection
+        import cv2
+
+        now = time.monotonic() if now is None else now
+        self.checks += 1
+        self._checks.inc()
+        cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_RGB2GRAY, dst=self._gray)
+
+        if self._background is None:
+            self._background = self._gray.astype(np.float32)
+            self._last_motion = now
+            self.idle = False
+            return True
+
+        diff = np.abs(self._gray - self._background)
+        self.last_change = np.count_nonzero(diff > self.threshold) / diff.size
+        # Lighting drifts and parked objects fade into the background
+        cv2.accumulateWeighted(self._gray, self._background, self.learning_rate)
+
+        if self.last_change >= self.min_area:
+            self._last_motion = now
+        self.idle = now - self._last_motion >= self.cooldown
+        if self.idle:
+            self.skipped += 1
+            self._skipped.inc()
+            if self.cost is not None:
+                self._saved.inc(self.cost())
+        return not self.idle
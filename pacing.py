@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import deque
+
+import metrics
+
+DISPLAY_FPS = metrics.REGISTRY.gauge("facerec_display_fps", "Frames drawn per second")
+RECOGNITION_FPS = metrics.REGISTRY.gauge("facerec_recognition_fps", "Frames recognised per second")
+DETECTION_SCALE = metrics.REGISTRY.gauge("facerec_detection_scale", "Detection scale currently in use")
+SCALE_CHANGES = metrics.REGISTRY.counter("facerec_detection_scale_changes_total",
+                                         "Times the scheduler raised or lowered the detection scale")
+
+
+class RateMeter:
+    # Events per second over a sliding window
+    def __init__(self, window=2.0):
+        self.window = window
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def tick(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._times.append(now)
+            while self._times and now - self._times[0] > self.window:
+                self._times.popleft()
+
+    def rate(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            while self._times and now - self._times[0] > self.window:
+                self._times.popleft()
+            if len(self._times) < 2:
+                return 0.0
+            return (len(self._times) - 1) / max(now - self._times[0], 1e-6)
+
+
+class AdaptiveScheduler:
+    # Paces the display loop and the recognition worker separately. The
+    # display runs at display_fps minus whatever drawing costs; recognition
+    # is held to recognition_fps per source, and when a frame costs more
+    # than that budget the detection scale steps down (frames in between
+    # are simply skipped), stepping back up once there is headroom again
+    def __init__(self, display_fps=30, recognition_fps=10, scales=(1.0, 0.5, 0.25), max_scale=0.5,
+                 sources=1, smoothing=0.2, recover_after=20):
+        self.display_fps = display_fps
+        self.recognition_fps = recognition_fps
+        self.scales = sorted(scales, reverse=True)
+        self.max_scale = max_scale
+        self.sources = sources
+        self.smoothing = smoothing
+        self.recover_after = recover_after
+        self.display_meter = RateMeter()
+        self.recognition_meter = RateMeter()
+        self.render_cost = 0.0
+        self.recognition_cost = 0.0
+        self._level = self._ceiling()
+        self._headroom = 0
+        self._next_recognition = 0.0
+        self._lock = threading.Lock()
+
+    def _ceiling(self):
+        # Index of the largest scale the user allows
+        for level, scale in enumerate(self.scales):
+            if scale <= self.max_scale:
+                return level
+        return len(self.scales) - 1
+
+    @property
+    def detection_scale(self):
+        return self.scales[max(self._level, self._ceiling())]
+
+    def set_max_scale(self, scale):
+        with self._lock:
+            self.max_scale = scale
+            self._level = self._ceiling()
+            self._headroom = 0
+
+    @property
+    def recognition_budget(self):
+        return 1.0 / (self.recognition_fps * max(1, self.sources))
+
+    def display_delay(self, render_cost):
+        # Milliseconds until the next display tick
+        self.display_meter.tick()
+        self.render_cost += self.smoothing * (render_cost - self.render_cost)
+        return max(1, int((1.0 / self.display_fps - render_cost) * 1000))
+
+    def recognition_wait(self):
+        # Seconds the recognition worker should sleep before taking the
+        # newest frame; frames captured meanwhile are dropped, not queued
+        return max(0.0, self._next_recognition - time.monotonic())
+
+    def record_recognition(self, cost):
+        now = time.monotonic()
+        self.recognition_meter.tick(now)
+        budget = self.recognition_budget
+        with self._lock:
+            self._next_recognition = now + max(0.0, budget - cost)
+            self.recognition_cost += self.smoothing * (cost - self.recognition_cost)
+
+            if self.recognition_cost > budget * 1.1 and self._level < len(self.scales) - 1:
+                # Falling behind: shed detection work
+                self._level = max(self._level, self._ceiling()) + 1
+                self._headroom = 0
+                self.recognition_cost = min(self.recognition_cost, budget)
+                SCALE_CHANGES.inc()
+            elif self.recognition_cost < budget * 0.5 and self._level > self._ceiling():
+                self._headroom += 1
+                if self._headroom >= self.recover_after:
+                    self._level -= 1
+                    self._headroom = 0
+                    SCALE_CHANGES.inc()
+            else:
+                self._headroom = 0
+        DETECTION_SCALE.set(self.detection_scale)
+
+    def rates(self):
+        display, recognition = self.display_meter.rate(), self.recognition_meter.rate()
+        DISPLAY_FPS.set(display)
+        RECOGNITION_FPS.set(recognition)
+        return display, recognition
@@ -0,0 +1,214 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import metrics
+from capture import FrameSlot, slot_for_result
+from detection import detect_and_encode
+
+# Shared-memory blocks already attached in this worker process, by name
+_attached = {}
+
+
+def _run_shared(process, name, shape, dtype, options):
+    shm = _attached.get(name)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = shm
+    frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return process(frame, **options)
+
+
+class RecognitionPool:
+    # Process pool for detection/encoding. Frames are copied into a fixed set
+    # of shared-memory blocks instead of being pickled, and the number of
+    # blocks bounds how many frames can be in flight at once
+    def __init__(self, workers=None, max_pending=None, frame_bytes=640 * 480 * 3,
+                 process=detect_and_encode, **options):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.frame_bytes = frame_bytes
+        self.process = process
+        self.options = options
+
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._blocks = [shared_memory.SharedMemory(create=True, size=frame_bytes)
+                        for _ in range(self.max_pending)]
+        self._free = queue.Queue()
+        for block in self._blocks:
+            self._free.put(block)
+        self._pending = deque()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def has_capacity(self):
+        return not self._free.empty()
+
+    def ready(self):
+        return bool(self._pending) and self._pending[0][1].done()
+
+    def submit(self, frame, tag=None, timeout=None, **options):
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes > self.frame_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes exceeds the {self.frame_bytes} byte buffer")
+
+        # Blocks until a buffer is free; this is the backpressure point
+        block = self._free.get(timeout=timeout)
+        np.ndarray(frame.shape, dtype=frame.dtype, buffer=block.buf)[...] = frame
+
+        future = self._executor.submit(_run_shared, self.process, block.name, frame.shape,
+                                       frame.dtype.str, dict(self.options, **options))
+        future.add_done_callback(lambda f, block=block: self._free.put(block))
+        self._pending.append((tag, future))
+        return future
+
+    def next_result(self, timeout=None):
+        # Results always come back in submission order
+        if not self._pending:
+            raise LookupError("No frames pending")
+        tag, future = self._pending[0]
+        future.exception(timeout)
+        self._pending.popleft()
+        return tag, future.result()
+
+    def results(self):
+        while self._pending:
+            yield self.next_result()
+
+    def map(self, frames, tags=None):
+        tags = iter(tags) if tags is not None else None
+        for frame in frames:
+            tag = next(tags) if tags is not None else None
+            while not self.has_capacity() and self._pending:
+                yield self.next_result()
+            self.submit(frame, tag)
+        yield from self.results()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._pending.clear()
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+
+
+class PoolRecognitionWorker(threading.Thread):
+    # Same role as capture.RecognitionWorker, but keeps up to max_pending
+    # frames in flight on the pool. `finish` turns (locations, encodings)
+    # into the result the UI draws and runs in this thread, in frame order.
+    # `options` is called per frame for per-submit process options. Frames
+    # from a VideoSource finish as finish(locations, encodings, source).
+    # Frames an optional `gate(packet)` rejects are never submitted.
+    # Failures, in a pool worker or in `finish`, are counted and passed to
+    # `on_error(e)` on this thread
+    def __init__(self, frame_slot, pool, finish, result_slot=None, active=None, options=None,
+                 poll_interval=0.01, pacer=None, gate=None, on_error=None):
+        super().__init__(daemon=True)
+        self.frame_slot = frame_slot
+        self.pool = pool
+        self.finish = finish
+        self.result_slot = result_slot or FrameSlot()
+        self.active = active
+        self.options = options
+        self.poll_interval = poll_interval
+        self.pacer = pacer
+        self.gate = gate
+        self.on_error = on_error
+        self.processed = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_latency = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        last_seq = 0
+        while not self._stop_event.is_set():
+            while self.pool.ready():
+                self._publish()
+
+            if not self.pool.has_capacity():
+                self._publish(self.poll_interval)
+                continue
+            wait = self.pacer.recognition_wait() if self.pacer is not None else 0
+            if wait > 0:
+                if self.pool.pending:
+                    self._publish(min(self.poll_interval, wait))
+                else:
+                    self._stop_event.wait(min(self.poll_interval, wait))
+                continue
+
+            packet = self.frame_slot.wait(last_seq, timeout=self.poll_interval)
+            if packet is None:
+                if self.frame_slot.closed:
+                    break
+                continue
+            last_seq = packet.seq
+
+            if self.active is not None and not self.active():
+                if not self.pool.pending:
+                    slot_for_result(self, packet).put([], packet.timestamp)
+                continue
+            if self.gate is not None and not self.gate(packet):
+                continue
+            options = self.options() if self.options is not None else {}
+            self.pool.submit(packet.value, tag=packet, **options)
+
+        # Let in-flight frames finish so their buffers are returned
+        while self.pool.pending:
+            self._publish()
+
+    def _publish(self, timeout=None):
+        try:
+            packet, (face_locations, face_encodings) = self.pool.next_result(timeout)
+        except TimeoutError:
+            return
+        except Exception as e:
+            self._failed("pool", e)
+            return
+
+        try:
+            if packet.source is None:
+                result = self.finish(face_locations, face_encodings)
+            else:
+                result = self.finish(face_locations, face_encodings, packet.source)
+        except Exception as e:
+            self._failed("finish", e)
+            return
+
+        slot_for_result(self, packet).put(result, packet.timestamp)
+        self.last_latency = time.monotonic() - packet.timestamp
+        metrics.FRAME_LATENCY.observe(self.last_latency)
+        if self.pacer is not None:
+            # Frames overlap on the pool, so each costs about its share
+            self.pacer.record_recognition(self.last_latency / self.pool.workers)
+        self.processed += 1
+
+    def _failed(self, stage, error):
+        self.errors += 1
+        self.last_error = error
+        metrics.RECOGNITION_ERRORS.labels(stage).inc()
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
@@ -0,0 +1,162 @@
+import argparse
+import csv
+import json
+import sys
+from datetime import date
+
+from storage import open_storage
+
+# Every query is bounded by a date range on attendance(date) and read
+# through Storage.stream, so report size never limits memory
+DAILY_SQL = """
+    SELECT a.date AS date,
+        COUNT(*) AS present,
+        SUM(CASE WHEN a.time_out IS NOT NULL THEN 1 ELSE 0 END) AS checked_out,
+        MIN(a.time_in) AS first_in,
+        MAX(a.time_in) AS last_in
+    FROM attendance a
+    WHERE a.date BETWEEN %s AND %s
+    GROUP BY a.date
+    ORDER BY a.date
+"""
+
+COURSE_SQL = """
+    SELECT c.course_id AS course_id, c.name AS course,
+        COUNT(DISTINCT sc.student_id) AS enrolled,
+        COUNT(a.attendance_id) AS attended
+    FROM courses c
+    LEFT JOIN student_courses sc ON sc.course_id = c.course_id
+    LEFT JOIN attendance a ON a.student_id = sc.student_id AND a.date BETWEEN %s AND %s
+    GROUP BY c.course_id, c.name
+    ORDER BY c.name
+"""
+
+STUDENT_SQL = """
+    SELECT s.student_id AS student_id, s.name AS name,
+        COUNT(a.attendance_id) AS days_present,
+        SUM(CASE WHEN a.time_out IS NOT NULL THEN 1 ELSE 0 END) AS days_checked_out,
+        MIN(a.date) AS first_seen,
+        MAX(a.date) AS last_seen
+    FROM students s
+    LEFT JOIN attendance a ON a.student_id = s.student_id AND a.date BETWEEN %s AND %s
+    {where}
+    GROUP BY s.student_id, s.name
+    ORDER BY s.name
+"""
+
+EXPORT_SQL = """
+    SELECT a.date AS date, a.student_id AS student_id, s.name AS name,
+        a.time_in AS time_in, a.time_out AS time_out, a.status AS status
+    FROM attendance a
+    JOIN students s ON s.student_id = a.student_id
+    WHERE a.date BETWEEN %s AND %s
+    ORDER BY a.date, a.student_id
+"""
+
+REPORT_COLUMNS = {
+    "daily": ["date", "present", "enrolled", "rate", "checked_out", "first_in", "last_in"],
+    "course": ["course_id", "course", "enrolled", "attended", "school_days", "rate"],
+    "student": ["student_id", "name", "days_present", "school_days", "rate", "days_checked_out",
+                "first_seen", "last_seen"],
+    "export": ["date", "student_id", "name", "time_in", "time_out", "status"],
+}
+
+
+def school_days(storage, start, end):
+    # Days on which anyone checked in count as school days
+    row = storage.fetchone("SELECT COUNT(DISTINCT date) AS days FROM attendance WHERE date BETWEEN %s AND %s",
+                           (start, end))
+    return row['days'] or 0
+
+
+def _rate(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def daily_summary(storage, start, end, chunk_size=1000):
+    enrolled = storage.fetchone("SELECT COUNT(*) AS students FROM students")['students']
+    for row in storage.stream(DAILY_SQL, (start, end), chunk_size):
+        row['enrolled'] = enrolled
+        row['rate'] = _rate(row['present'], enrolled)
+        yield row
+
+
+def course_summary(storage, start, end, chunk_size=1000):
+    days = school_days(storage, start, end)
+    for row in storage.stream(COURSE_SQL, (start, end), chunk_size):
+        row['school_days'] = days
+        row['rate'] = _rate(row['attended'], row['enrolled'] * days)
+        yield row
+
+
+def student_summary(storage, start, end, student_id=None, chunk_size=1000):
+    days = school_days(storage, start, end)
+    sql = STUDENT_SQL.format(where="WHERE s.student_id = %s" if student_id is not None else "")
+    params = (start, end, student_id) if student_id is not None else (start, end)
+    for row in storage.stream(sql, params, chunk_size):
+        row['school_days'] = days
+        row['rate'] = _rate(row['days_present'], days)
+        yield row
+
+
+def export_attendance(storage, start, end, chunk_size=1000):
+    return storage.stream(EXPORT_SQL, (start, end), chunk_size)
+
+
+def write_rows(rows, out, columns, fmt="csv"):
+    # Writes as rows arrive; returns how many were written
+    count = 0
+    if fmt == "jsonl":
+        for row in rows:
+            out.write(json.dumps({column: row.get(column) for column in columns}, default=str) + "\n")
+            count += 1
+        return count
+
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(["" if row.get(column) is None else row.get(column) for column in columns])
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Attendance summaries and exports")
+    parser.add_argument("report", choices=list(REPORT_COLUMNS), help="Report to produce")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, required=True, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="Last day (default: today)")
+    parser.add_argument("--student-id", type=int, help="Limit the student report to one student")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    parser.add_argument("--output", help="Write here instead of stdout")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows fetched per round trip")
+    parser.add_argument("--backend", choices=["mysql", "sqlite"], help="Storage backend (default from environment)")
+    parser.add_argument("--db-path", help="SQLite database file")
+    args = parser.parse_args(argv)
+
+    end = args.end or date.today()
+    storage = open_storage(args.backend, args.db_path, host="localhost", user="root",
+                           password="lashchou", database="attendance_db")
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    rows = None
+    try:
+        if args.report == "daily":
+            rows = daily_summary(storage, args.start, end, args.chunk_size)
+        elif args.report == "course":
+            rows = course_summary(storage, args.start, end, args.chunk_size)
+        elif args.report == "student":
+            rows = student_summary(storage, args.start, end, args.student_id, args.chunk_size)
+        else:
+            rows = export_attendance(storage, args.start, end, args.chunk_size)
+        count = write_rows(rows, out, REPORT_COLUMNS[args.report], args.format)
+    finally:
+        # Releases the cursor before the connection goes away
+        if rows is not None:
+            rows.close()
+        if out is not sys.stdout:
+            out.close()
+        storage.close()
+    print(f"{count} rows", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
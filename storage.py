@@ -0,0 +1,373 @@
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import date, datetime
+
+MYSQL_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS students (
+        student_id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        age INT,
+        gender VARCHAR(20),
+        email VARCHAR(100),
+        phone VARCHAR(20),
+        image_path VARCHAR(255),
+        face_encoding BLOB,
+        registration_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY unique_name (name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS attendance (
+        attendance_id INT AUTO_INCREMENT PRIMARY KEY,
+        student_id INT,
+        date DATE NOT NULL,
+        time_in DATETIME,
+        time_out DATETIME,
+        status VARCHAR(20),
+        FOREIGN KEY (student_id) REFERENCES students(student_id),
+        UNIQUE KEY unique_attendance (student_id, date)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS courses (
+        course_id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        description TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS student_courses (
+        student_id INT,
+        course_id INT,
+        PRIMARY KEY (student_id, course_id),
+        FOREIGN KEY (student_id) REFERENCES students(student_id),
+        FOREIGN KEY (course_id) REFERENCES courses(course_id)
+    )
+    """,
+]
+
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS students (
+        student_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(100) NOT NULL,
+        age INT,
+        gender VARCHAR(20),
+        email VARCHAR(100),
+        phone VARCHAR(20),
+        image_path VARCHAR(255),
+        face_encoding BLOB,
+        registration_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT unique_name UNIQUE (name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS attendance (
+        attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INT,
+        date DATE NOT NULL,
+        time_in DATETIME,
+        time_out DATETIME,
+        status VARCHAR(20),
+        FOREIGN KEY (student_id) REFERENCES students(student_id),
+        CONSTRAINT unique_attendance UNIQUE (student_id, date)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS courses (
+        course_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(100) NOT NULL,
+        description TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS student_courses (
+        student_id INT,
+        course_id INT,
+        PRIMARY KEY (student_id, course_id),
+        FOREIGN KEY (student_id) REFERENCES students(student_id),
+        FOREIGN KEY (course_id) REFERENCES courses(course_id)
+    )
+    """,
+]
+
+
+# Secondary indexes for the reports, history paging and roster sync:
+# (table, index name, columns)
+INDEXES = [
+    ("attendance", "idx_attendance_date", "date, student_id"),
+    ("attendance", "idx_attendance_time_in", "time_in"),
+    ("attendance", "idx_attendance_time_out", "time_out"),
+    ("student_courses", "idx_student_courses_course", "course_id, student_id"),
+    ("students", "idx_students_registration_date", "registration_date"),
+]
+
+
+class Storage(ABC):
+    # Every call checks out its own connection, so the UI thread, the
+    # recognition worker and the attendance writer never share a cursor.
+    # Queries are written with %s placeholders for all backends
+    schema = []
+    data_dir = "."
+    IntegrityError = Exception
+
+    @abstractmethod
+    def transaction(self):
+        # A context manager yielding a cursor; commits on success, rolls
+        # back on error
+        pass
+
+    def execute(self, sql, params=()):
+        with self.transaction() as cursor:
+            cursor.execute(self._sql(sql), params)
+            return cursor.lastrowid
+
+    def executemany(self, sql, rows):
+        with self.transaction() as cursor:
+            cursor.executemany(self._sql(sql), rows)
+
+    def fetchall(self, sql, params=()):
+        with self.transaction() as cursor:
+            cursor.execute(self._sql(sql), params)
+            return [self._row(cursor, row) for row in cursor.fetchall()]
+
+    def fetchone(self, sql, params=()):
+        with self.transaction() as cursor:
+            cursor.execute(self._sql(sql), params)
+            row = cursor.fetchone()
+            return None if row is None else self._row(cursor, row)
+
+    def stream(self, sql, params=(), chunk_size=1000):
+        # Yields rows chunk_size at a time, so memory stays flat however
+        # large the result. The connection is held until the generator is
+        # exhausted or closed
+        with self.transaction() as cursor:
+            cursor.execute(self._sql(sql), params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield self._row(cursor, row)
+
+    def create_tables(self):
+        with self.transaction() as cursor:
+            for statement in self.schema:
+                cursor.execute(statement)
+            for table, name, columns in INDEXES:
+                self._create_index(cursor, table, name, columns)
+
+    def _create_index(self, cursor, table, name, columns):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+    def write_attendance(self, check_ins, check_outs):
+        # check_ins: (student_id, date, time_in, status)
+        # check_outs: (time_out, student_id, date)
+        with self.transaction() as cursor:
+            # Check-ins go first so a check-out in the same batch finds its
+            # row; re-sent check-ins are ignored by the unique key
+            if check_ins:
+                cursor.executemany(self._sql(self.insert_ignore_attendance), check_ins)
+            if check_outs:
+                cursor.executemany(self._sql(
+                    """UPDATE attendance SET time_out = %s
+                    WHERE student_id = %s AND date = %s AND time_out IS NULL"""
+                ), check_outs)
+
+    def _sql(self, sql):
+        return sql
+
+    def _row(self, cursor, row):
+        return row
+
+    def close(self):
+        pass
+
+
+class MySQLStorage(Storage):
+    schema = MYSQL_SCHEMA
+    insert_ignore_attendance = """INSERT INTO attendance (student_id, date, time_in, status)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE time_in = time_in"""
+
+    def __init__(self, host="localhost", user="root", password="", database="attendance_db", pool_size=5):
+        import mysql.connector
+        from mysql.connector import errors, pooling
+
+        self.IntegrityError = mysql.connector.IntegrityError
+        self._connection_errors = (errors.OperationalError, errors.InterfaceError)
+
+        self._pool = pooling.MySQLConnectionPool(
+            pool_name=f"attendance_{id(self)}",
+            pool_size=pool_size,
+            host=host,
+            user=user,
+            password=password,
+            database=database,
+        )
+        # The connector raises instead of waiting when the pool is empty
+        self._available = threading.BoundedSemaphore(pool_size)
+
+    @contextmanager
+    def transaction(self):
+        with self._available:
+            # The pool pings and reconnects dropped connections on checkout
+            conn = self._pool.get_connection()
+            try:
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    yield cursor
+                    conn.commit()
+                except BaseException:
+                    self._rollback(conn)
+                    raise
+                finally:
+                    cursor.close()
+            finally:
+                conn.close()  # returns it to the pool
+
+    def _rollback(self, conn):
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+
+    def stream(self, sql, params=(), chunk_size=1000):
+        # The dictionary cursor is unbuffered, so rows come off the server
+        # as they are read. A result that is abandoned early still has to
+        # be drained before the connection goes back to the pool
+        with self._available:
+            conn = self._pool.get_connection()
+            try:
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    cursor.execute(sql, params)
+                    while True:
+                        rows = cursor.fetchmany(chunk_size)
+                        if not rows:
+                            return
+                        yield from rows
+                finally:
+                    try:
+                        while cursor.fetchmany(chunk_size):
+                            pass
+                    except Exception:
+                        pass
+                    cursor.close()
+            finally:
+                conn.close()
+
+    def _create_index(self, cursor, table, name, columns):
+        # MySQL has no CREATE INDEX IF NOT EXISTS
+        cursor.execute(
+            """SELECT COUNT(*) AS found FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s""",
+            (table, name)
+        )
+        if not cursor.fetchone()['found']:
+            cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+
+    def fetchall(self, sql, params=()):
+        return self._retry(super().fetchall, sql, params)
+
+    def fetchone(self, sql, params=()):
+        return self._retry(super().fetchone, sql, params)
+
+    def write_attendance(self, check_ins, check_outs):
+        return self._retry(super().write_attendance, check_ins, check_outs)
+
+    def _retry(self, method, *args):
+        # A connection can still die between checkout and the statement;
+        # one retry gets a freshly reconnected one. Only used for reads and
+        # the idempotent attendance upsert, never for plain inserts
+        try:
+            return method(*args)
+        except self._connection_errors:
+            return method(*args)
+
+
+def _adapt_datetime(value):
+    return value.isoformat(" ")
+
+
+def _convert_datetime(value):
+    return datetime.fromisoformat(value.decode())
+
+
+def _convert_date(value):
+    return date.fromisoformat(value.decode())
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("DATETIME", _convert_datetime)
+sqlite3.register_converter("DATE", _convert_date)
+
+
+class SQLiteStorage(Storage):
+    schema = SQLITE_SCHEMA
+    IntegrityError = sqlite3.IntegrityError
+    insert_ignore_attendance = """INSERT OR IGNORE INTO attendance (student_id, date, time_in, status)
+        VALUES (%s, %s, %s, %s)"""
+
+    def __init__(self, path="attendance_db.sqlite3", timeout=10.0):
+        self.path = path
+        self.timeout = timeout
+        self.data_dir = os.path.dirname(os.path.abspath(path))
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # One connection per thread; WAL lets readers run alongside the writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self._connection()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def _sql(self, sql):
+        return sql.replace("%s", "?")
+
+    def _row(self, cursor, row):
+        return {column[0]: value for column, value in zip(cursor.description, row)}
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def open_storage(backend=None, path=None, **mysql_options):
+    # ATTENDANCE_DB_BACKEND=sqlite runs the app without a MySQL server
+    backend = backend or os.environ.get("ATTENDANCE_DB_BACKEND", "mysql")
+    if backend == "sqlite":
+        return SQLiteStorage(path or os.environ.get("ATTENDANCE_DB_PATH", "attendance_db.sqlite3"))
+    if backend == "mysql":
+        return MySQLStorage(**mysql_options)
+    raise ValueError(f"Unknown storage backend: {backend}")
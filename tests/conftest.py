@@ -0,0 +1,34 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import SQLiteStorage  # noqa: E402
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "attendance.sqlite3"))
+    storage.create_tables()
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def make_encodings():
+    # Random vectors with roughly the spread of face_recognition's (norm ~1)
+    rng = np.random.default_rng(0)
+    return lambda count, dim=128: rng.normal(scale=0.09, size=(count, dim))
+
+
+def insert_student(storage, name, encoding, registration_date=None):
+    from encoding_format import pack
+
+    if registration_date is None:
+        return storage.execute("INSERT INTO students (name, face_encoding) VALUES (%s, %s)",
+                               (name, pack(encoding, "float64")))
+    return storage.execute("INSERT INTO students (name, face_encoding, registration_date) VALUES (%s, %s, %s)",
+                           (name, pack(encoding, "float64"), registration_date))
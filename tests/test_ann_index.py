@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from ann_index import create_index, load_index, save_index
+from gallery import FaceGallery
+
+
+def clustered(make_encodings, clusters=40, per_cluster=25):
+    centres = make_encodings(clusters)
+    return np.repeat(centres, per_cluster, axis=0) + make_encodings(clusters * per_cluster) * 0.1
+
+
+@pytest.mark.parametrize("kind", ["ivf", "lsh"])
+def test_index_recall_against_exact_search(make_encodings, kind):
+    encodings = clustered(make_encodings)
+    faces = encodings[::50] + make_encodings(len(encodings[::50])) * 0.02
+    gallery = FaceGallery()
+    gallery.add_many(encodings, [{'student_id': i} for i in range(len(encodings))])
+    exact = [matches[0][0]['student_id'] for matches in gallery.match(faces, exact=True)]
+
+    gallery.set_index(create_index(kind))
+    found = [matches[0][0]['student_id'] if matches else None for matches in gallery.match(faces)]
+    assert np.mean([a == b for a, b in zip(exact, found)]) >= 0.9
+
+
+@pytest.mark.parametrize("kind", ["ivf", "lsh"])
+def test_save_and_load_round_trip(tmp_path, make_encodings, kind):
+    encodings = clustered(make_encodings)
+    ids = list(range(100, 100 + len(encodings)))
+    index = create_index(kind)
+    index.build(encodings)
+    path = str(tmp_path / f"roster.{kind}.npz")
+    save_index(index, path, ids)
+
+    restored = load_index(path, ids)
+    assert restored.kind == kind and len(restored) == len(index)
+    faces = encodings[::37]
+    for expected, found in zip(index.candidates(faces), restored.candidates(faces)):
+        np.testing.assert_array_equal(np.sort(expected), np.sort(found))
+
+    # A roster that changed since the save is rejected
+    assert load_index(path, ids[:-1] + [0]) is None
+
+
+def test_unknown_index_kind():
+    with pytest.raises(ValueError):
+        create_index("hnsw")
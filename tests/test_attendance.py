@@ -0,0 +1,105 @@
+import json
+from datetime import datetime
+
+from attendance import CHECK_IN, CHECK_OUT, AttendanceState, AttendanceWriter
+from conftest import insert_student
+from storage import SQLiteStorage
+
+MORNING = datetime(2026, 3, 2, 8, 30)
+AFTERNOON = datetime(2026, 3, 2, 15, 45)
+
+
+def test_state_checks_in_then_out_once():
+    state = AttendanceState()
+    assert state.record(1, MORNING).kind == CHECK_IN
+    assert state.record(1, AFTERNOON).kind == CHECK_OUT
+    assert state.record(1, AFTERNOON) is None
+    assert state.status(1, MORNING.date()) == CHECK_OUT
+    assert state.status(2, MORNING.date()) is None
+
+    # A new day starts from scratch
+    assert state.record(1, datetime(2026, 3, 3, 8, 0)).kind == CHECK_IN
+
+
+def test_state_loads_each_day_once():
+    calls = []
+
+    def loader(day):
+        calls.append(day)
+        return [(1, MORNING, None)]
+
+    state = AttendanceState(loader)
+    assert state.record(1, AFTERNOON).kind == CHECK_OUT
+    assert state.record(2, AFTERNOON).kind == CHECK_IN
+    assert calls == [MORNING.date()]
+
+
+class FlakyStorage(SQLiteStorage):
+    failures = 1
+
+    def write_attendance(self, check_ins, check_outs):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("connection lost")
+        return super().write_attendance(check_ins, check_outs)
+
+
+def test_writer_keeps_a_failed_batch_for_the_next_flush(tmp_path, make_encodings):
+    storage = FlakyStorage(str(tmp_path / "flaky.sqlite3"))
+    storage.create_tables()
+    first, second = (insert_student(storage, name, encoding) for name, encoding in zip("ab", make_encodings(2)))
+    state = AttendanceState()
+    errors = []
+    writer = AttendanceWriter(storage, flush_interval=0.05, on_error=errors.append)
+
+    assert not writer.flush([state.record(first, MORNING)])
+    assert len(errors) == 1
+
+    writer.start()
+    writer.submit(state.record(second, MORNING))
+    writer.submit(state.record(first, AFTERNOON))
+    writer.close()
+
+    rows = storage.fetchall("SELECT student_id, time_in, time_out FROM attendance ORDER BY student_id")
+    assert [(row['student_id'], row['time_in'], row['time_out']) for row in rows] == [
+        (first, MORNING, AFTERNOON),
+        (second, MORNING, None),
+    ]
+    assert writer.written == 3
+    storage.close()
+
+
+def test_writer_reports_the_first_failure_and_the_recovery(tmp_path, make_encodings):
+    storage = FlakyStorage(str(tmp_path / "flaky.sqlite3"))
+    storage.create_tables()
+    storage.failures = 3
+    student = insert_student(storage, "a", make_encodings(1)[0])
+    errors, recoveries = [], []
+    writer = AttendanceWriter(storage, on_error=errors.append, on_recover=recoveries.append)
+
+    event = AttendanceState().record(student, MORNING)
+    for _ in range(3):
+        assert not writer.flush([event])
+        writer._retry = []
+    assert len(errors) == 1 and recoveries == []
+    assert writer.flush([event])
+    assert recoveries == [3] and writer.failures == 0
+    storage.close()
+
+
+def test_writer_saves_events_the_final_flush_could_not_write(tmp_path, make_encodings):
+    storage = FlakyStorage(str(tmp_path / "flaky.sqlite3"))
+    storage.create_tables()
+    storage.failures = 10
+    student = insert_student(storage, "a", make_encodings(1)[0])
+    unsent_path = tmp_path / "unsent.jsonl"
+    writer = AttendanceWriter(storage, flush_interval=10.0, unsent_path=str(unsent_path))
+    writer.start()
+    writer.submit(AttendanceState().record(student, MORNING))
+    writer.close()
+
+    assert writer.unsent == 1
+    assert json.loads(unsent_path.read_text()) == {
+        "kind": CHECK_IN, "student_id": student, "date": "2026-03-02", "timestamp": "2026-03-02T08:30:00",
+    }
+    storage.close()
@@ -0,0 +1,54 @@
+import threading
+import time
+
+import metrics
+from capture import FairScheduler, FrameSlot, RecognitionWorker
+
+
+def test_recognition_failures_are_counted_and_reported():
+    slot = FrameSlot()
+    errors = []
+    reported = threading.Event()
+
+    def process(frame):
+        raise RuntimeError("detector broke")
+
+    def on_error(e):
+        errors.append(e)
+        reported.set()
+
+    failures = metrics.RECOGNITION_ERRORS.labels("recognize")
+    before = failures.value
+    worker = RecognitionWorker(slot, process, poll_interval=0.01, on_error=on_error)
+    worker.start()
+    slot.put("frame")
+    assert reported.wait(2.0)
+    slot.close()
+    worker.stop()
+
+    assert worker.errors == 1 and worker.processed == 0
+    assert str(errors[0]) == "detector broke"
+    assert failures.value == before + 1
+    assert worker.result_slot.latest() is None
+
+
+def test_fair_scheduler_sleeps_until_a_frame_arrives():
+    slots = [FrameSlot(), FrameSlot()]
+    scheduler = FairScheduler(slots)
+    assert scheduler.wait(timeout=0.01) is None
+
+    received = []
+    waiter = threading.Thread(target=lambda: received.append(scheduler.wait(timeout=2.0)))
+    waiter.start()
+    time.sleep(0.05)
+    slots[1].put("frame")
+    waiter.join(1.0)
+    assert received[0].value == "frame"
+
+    # Round-robin: with both slots full, neither is served twice in a row
+    slots[0].put("a")
+    slots[1].put("b")
+    assert [scheduler.wait(timeout=0).value for _ in range(2)] == ["a", "b"]
+
+    scheduler.close()
+    assert scheduler.wait() is None
@@ -0,0 +1,53 @@
+import time
+
+import numpy as np
+import pytest
+
+from detectors import calibrate, create_detector, dnn_blob
+
+cv2 = pytest.importorskip("cv2")
+
+
+def test_dnn_blob_subtracts_the_bgr_mean_after_swapping():
+    frame = np.empty((300, 300, 3), dtype=np.uint8)
+    frame[:] = (200, 100, 50)  # RGB
+    blob = dnn_blob(frame)
+    assert blob.shape == (1, 3, 300, 300)
+    # B, G, R minus the res10 means (104, 177, 123)
+    np.testing.assert_allclose(blob[0, :, 0, 0], [50 - 104, 100 - 177, 200 - 123])
+
+
+class FakeDetector:
+    def __init__(self, boxes, delay=0.0):
+        self.boxes = boxes
+        self.delay = delay
+
+    def detect(self, frame):
+        if self.delay:
+            time.sleep(self.delay)
+        return list(self.boxes)
+
+
+def test_calibrate_picks_the_fastest_accurate_backend():
+    frames = [np.zeros((120, 160, 3), dtype=np.uint8)] * 3
+    face = (10, 60, 60, 10)
+    detectors = {
+        "hog": FakeDetector([face], delay=0.01),
+        "haar": FakeDetector([face, (70, 150, 110, 100)]),  # a false positive per frame
+        "dnn": FakeDetector([face], delay=0.002),
+    }
+    chosen, report = calibrate(detectors, frames, accuracy_floor=0.8)
+    assert chosen == "dnn"
+    assert [row["detector"] for row in report] == ["hog", "haar", "dnn"]
+    assert report[1]["precision"] == pytest.approx(0.5)
+
+    # Nobody in view: nothing to compare on, so the reference is kept
+    empty = {kind: FakeDetector([]) for kind in detectors}
+    assert calibrate(empty, frames)[0] == "hog"
+
+
+def test_calibrate_needs_a_backend():
+    with pytest.raises(ValueError):
+        calibrate({}, [])
+    with pytest.raises(ValueError):
+        create_detector("cnn")
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import numpy as np
+
+from encoding_cache import EncodingCache, cached_face_encodings
+
+
+def test_a_hit_does_not_import_face_recognition(tmp_path, monkeypatch, make_encodings):
+    image_path = tmp_path / "face.jpg"
+    image_path.write_bytes(b"not really a jpeg")
+    cache = EncodingCache(str(tmp_path / "cache"))
+    encodings = make_encodings(2)
+    cache.put(EncodingCache.key(image_path.read_bytes()), encodings)
+
+    monkeypatch.setitem(sys.modules, "face_recognition", None)  # any import fails
+    np.testing.assert_array_equal(cached_face_encodings(str(image_path), cache), encodings)
+    assert cache.hits == 1
+
+
+def test_put_evicts_only_past_the_limit(tmp_path, monkeypatch, make_encodings):
+    cache = EncodingCache(str(tmp_path), max_bytes=4 * 1200)
+    scans = []
+    entries = cache._entries
+    monkeypatch.setattr(cache, "_entries", lambda: scans.append(1) or entries())
+
+    for i in range(4):
+        cache.put(f"key{i}", make_encodings(1))
+        os.utime(cache._path(f"key{i}"), (i, i))
+    assert len(scans) == 1  # the initial size, nothing after
+    assert cache.total_bytes == sum(entry.stat().st_size for entry in os.scandir(tmp_path))
+
+    cache.put("key4", make_encodings(1))
+    assert len(scans) == 2
+    assert cache.get("key0") is None and cache.get("key4") is not None
+    assert cache.total_bytes <= cache.max_bytes
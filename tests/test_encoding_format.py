@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from conftest import insert_student
+from encoding_format import migrate_encodings, pack, unpack
+
+
+@pytest.mark.parametrize("precision, size, tolerance", [
+    ("float64", 1024, 0.0),
+    ("float16", 260, 1e-3),
+    ("int8", 136, 3e-3),
+])
+def test_pack_unpack_round_trip(make_encodings, precision, size, tolerance):
+    encoding = make_encodings(1)[0]
+    blob = pack(encoding, precision)
+    assert len(blob) == size
+    np.testing.assert_allclose(unpack(blob), encoding, atol=tolerance)
+
+
+def test_float64_stays_in_the_legacy_layout(make_encodings):
+    encoding = make_encodings(1)[0]
+    assert pack(encoding, "float64") == encoding.tobytes()
+
+
+def test_int8_handles_a_zero_vector():
+    np.testing.assert_array_equal(unpack(pack(np.zeros(128), "int8")), np.zeros(128))
+
+
+@pytest.mark.parametrize("blob", [b"", b"FE", b"XX\x01\x02" + bytes(132), b"FE\x09\x02" + bytes(132),
+                                  b"FE\x01\x02" + bytes(100)])
+def test_unpack_rejects_malformed_blobs(blob):
+    with pytest.raises(ValueError):
+        unpack(blob)
+
+
+def test_unknown_precision(make_encodings):
+    with pytest.raises(ValueError):
+        pack(make_encodings(1)[0], "int4")
+
+
+def test_migrate_encodings(storage, make_encodings):
+    encodings = make_encodings(7)
+    for i, encoding in enumerate(encodings):
+        insert_student(storage, f"student {i}", encoding)
+
+    assert migrate_encodings(storage, "int8", batch_size=3) == 7
+    rows = storage.fetchall("SELECT face_encoding FROM students ORDER BY student_id")
+    assert all(len(row['face_encoding']) == 136 for row in rows)
+    for row, encoding in zip(rows, encodings):
+        np.testing.assert_allclose(unpack(row['face_encoding']), encoding, atol=3e-3)
+
+    # Already compact rows are left alone
+    assert migrate_encodings(storage, "int8") == 0
+    assert migrate_encodings(storage, "float64") == 0
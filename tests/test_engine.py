@@ -0,0 +1,20 @@
+import pytest
+
+from engine import RecognitionEngine
+
+
+def test_identify_uses_the_engine_accept_rule(make_encodings):
+    encodings = make_encodings(2)
+    engine = RecognitionEngine(threshold=0.5)
+    engine.enroll(encodings[0], {'student_id': 1})
+    try:
+        near, far = encodings[0] + 0.001, encodings[1]
+        (student, distance), (stranger, far_distance) = engine.identify([near, far])
+        assert student['student_id'] == 1 and engine.accept(distance)
+        assert stranger is None and not engine.accept(far_distance)
+        assert engine.confidence(distance) == pytest.approx(1 - distance)
+
+        # The threshold is inclusive and the only cut-off
+        assert engine.accept(0.5) and not engine.accept(0.51) and not engine.accept(None)
+    finally:
+        engine.close()
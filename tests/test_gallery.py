@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+from ann_index import create_index
+from gallery import RETRAIN_GROWTH, FaceGallery, load_snapshot, save_snapshot
+
+
+def students(ids):
+    return [{'student_id': i, 'name': f"student {i}"} for i in ids]
+
+
+def brute_force(gallery_encodings, faces):
+    return np.linalg.norm(faces[:, None, :] - gallery_encodings[None, :, :], axis=2)
+
+
+def test_match_agrees_with_brute_force(make_encodings):
+    encodings = make_encodings(500)
+    faces = np.vstack([encodings[[3, 250, 499]] + make_encodings(3) * 0.1, make_encodings(2)])
+    gallery = FaceGallery()
+    gallery.add_many(encodings, students(range(500)))
+
+    expected = brute_force(encodings, faces)
+    for face, matches in zip(expected, gallery.match(faces, k=5)):
+        order = np.argsort(face)[:5]
+        assert [student['student_id'] for student, _ in matches] == list(order)
+        assert [distance for _, distance in matches] == pytest.approx(face[order])
+
+
+def test_match_tolerance_and_empty_inputs(make_encodings):
+    encodings = make_encodings(10)
+    gallery = FaceGallery()
+    assert gallery.match(encodings[:2]) == [[], []]
+
+    gallery.add_many(encodings, students(range(10)))
+    assert gallery.match(np.empty((0, 128))) == []
+    assert gallery.match(encodings[4] + 1.0, tolerance=0.6) == [[]]
+    assert gallery.match(encodings[4], tolerance=0.6)[0][0][0]['student_id'] == 4
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_compact_precision_finds_the_same_nearest_student(make_encodings, precision):
+    encodings = make_encodings(2000)
+    faces = encodings[::97] + make_encodings(len(encodings[::97])) * 0.2
+    exact = FaceGallery()
+    compact = FaceGallery(precision=precision)
+    exact.add_many(encodings, students(range(2000)))
+    compact.add_many(encodings, students(range(2000)))
+
+    for expected, found in zip(exact.match(faces), compact.match(faces)):
+        assert found[0][0] == expected[0][0]
+        assert found[0][1] == pytest.approx(expected[0][1], abs=0.01)
+    assert compact.nbytes < exact.nbytes / 3
+
+
+def test_add_many_overwrites_known_student_ids(make_encodings):
+    encodings = make_encodings(4)
+    gallery = FaceGallery()
+    gallery.add_many(encodings[:3], students([1, 2, 3]))
+    gallery.add_many(encodings[[3, 1, 2, 3]], students([1, 2, 3, 4]))
+
+    assert gallery.student_ids() == [1, 2, 3, 4]
+    assert gallery.match(encodings[3])[0][0][0]['student_id'] in (1, 4)
+    np.testing.assert_array_equal(gallery.encoding(gallery.row_of(1)), encodings[3])
+
+
+@pytest.mark.parametrize("kind", ["ivf", "lsh"])
+def test_index_on_empty_gallery_is_trained_by_the_first_rows(make_encodings, kind):
+    encodings = make_encodings(300)
+    gallery = FaceGallery()
+    gallery.set_index(create_index(kind))
+    assert not gallery.index.is_trained
+
+    gallery.add_many(encodings, students(range(300)))
+    assert gallery.index.is_trained and len(gallery.index) == 300
+    assert gallery.match(encodings[42])[0][0][0]['student_id'] == 42
+
+
+@pytest.mark.parametrize("kind", ["ivf", "lsh"])
+def test_replace_many_rebuilds_and_swaps_the_index(make_encodings, kind):
+    encodings = make_encodings(300)
+    replacement = make_encodings(2)
+    gallery = FaceGallery()
+    gallery.add_many(encodings, students(range(300)))
+    gallery.set_index(create_index(kind))
+    old_index = gallery.index
+
+    gallery.replace_many([10, 20], replacement, students([10, 20]))
+    assert gallery.index is not old_index and len(gallery.index) == 300
+    assert gallery.match(replacement[1])[0][0][0]['student_id'] == 20
+
+
+@pytest.mark.parametrize("precision", ["float64", "int8"])
+def test_snapshot_round_trip(tmp_path, make_encodings, precision):
+    encodings = make_encodings(50)
+    gallery = FaceGallery(precision=precision)
+    gallery.add_many(encodings, students(range(50)))
+    prefix = str(tmp_path / "gallery")
+    save_snapshot(gallery, prefix, (50, 49, "2026-01-01 00:00:00"))
+
+    loaded = FaceGallery(precision=precision)
+    assert load_snapshot(loaded, prefix, (50, 49, "2026-01-01 00:00:00"))
+    assert loaded.student_ids() == list(range(50))
+    np.testing.assert_allclose(loaded.encodings, gallery.encodings)
+
+    # Any change to the table, including a re-enrollment, invalidates it
+    assert not load_snapshot(FaceGallery(precision=precision), prefix, (50, 49, "2026-01-02 00:00:00"))
+    other = "float16" if precision == "int8" else "int8"
+    assert not load_snapshot(FaceGallery(precision=other), prefix, (50, 49, "2026-01-01 00:00:00"))
+
+
+@pytest.mark.parametrize("kind", ["ivf", "lsh"])
+def test_index_is_retrained_as_the_gallery_grows(make_encodings, kind):
+    encodings = make_encodings(2000)
+    gallery = FaceGallery()
+    gallery.set_index(create_index(kind))
+    for i, encoding in enumerate(encodings):
+        gallery.add(encoding, {'student_id': i})
+
+    assert len(gallery.index) == 2000
+    assert gallery.index.trained_size * RETRAIN_GROWTH > 2000
+    if kind == "ivf":
+        assert len(gallery.index.centroids) > 1
+    assert gallery.match(encodings[1500])[0][0][0]['student_id'] == 1500
@@ -0,0 +1,73 @@
+import numpy as np
+
+from conftest import insert_student
+from encoding_format import pack
+from gallery import FaceGallery
+from gallery_sync import STUDENT_COLUMNS, GallerySync, newest_registration
+
+
+def load_gallery(storage):
+    gallery = FaceGallery()
+    gallery.load_students(storage.fetchall(f"SELECT {STUDENT_COLUMNS} FROM students"))
+    return gallery
+
+
+def test_poll_pages_through_new_students(storage, make_encodings):
+    encodings = make_encodings(9)
+    for i in range(2):
+        insert_student(storage, f"student {i}", encodings[i], "2026-01-01 08:00:00")
+    gallery = load_gallery(storage)
+    sync = GallerySync(storage, gallery, batch_size=2)
+
+    for i in range(2, 9):
+        insert_student(storage, f"student {i}", encodings[i], "2026-01-01 09:00:00")
+    assert sync.poll() == (7, 0)
+    assert gallery.student_ids() == list(range(1, 10))
+    assert gallery.match(encodings[6])[0][0][0]['student_id'] == 7
+    assert sync.poll() == (0, 0)
+
+
+def test_poll_replaces_re_enrolled_students(storage, make_encodings):
+    encodings = make_encodings(4)
+    for i in range(3):
+        insert_student(storage, f"student {i}", encodings[i], "2026-01-01 08:00:00")
+    gallery = load_gallery(storage)
+    sync = GallerySync(storage, gallery)
+    assert sync.poll() == (0, 0)
+
+    storage.execute("UPDATE students SET face_encoding = %s, registration_date = %s WHERE student_id = %s",
+                    (pack(encodings[3], "float64"), "2026-01-02 08:00:00", 2))
+    assert sync.poll() == (0, 1)
+    assert len(gallery) == 3
+    np.testing.assert_array_equal(gallery.encoding(gallery.row_of(2)), encodings[3])
+    assert sync.poll() == (0, 0)
+
+
+def test_local_add_after_sync_does_not_duplicate(storage, make_encodings):
+    # A bulk enrollment commits its batches while GallerySync polls, then
+    # adds the same students to the gallery itself when it finishes
+    encodings = make_encodings(3)
+    gallery = load_gallery(storage)
+    sync = GallerySync(storage, gallery)
+    ids = [insert_student(storage, f"student {i}", encoding) for i, encoding in enumerate(encodings)]
+    assert sync.poll() == (3, 0)
+
+    gallery.add_many(encodings, [{'student_id': student_id} for student_id in ids])
+    assert gallery.student_ids() == ids
+
+
+def test_enrollments_before_the_first_poll_are_picked_up(storage, make_encodings):
+    encodings = make_encodings(4)
+    for i in range(2):
+        insert_student(storage, f"student {i}", encodings[i], "2026-01-01 08:00:00")
+    last_date = newest_registration(storage)
+    gallery = load_gallery(storage)
+
+    # Another kiosk re-enrolls one student and adds one before the sync
+    # thread is even created
+    storage.execute("UPDATE students SET face_encoding = %s, registration_date = %s WHERE student_id = %s",
+                    (pack(encodings[2], "float64"), "2026-01-01 08:00:10", 1))
+    insert_student(storage, "student 3", encodings[3], "2026-01-01 08:00:20")
+    sync = GallerySync(storage, gallery, last_date=last_date)
+    assert sync.poll() == (1, 1)
+    np.testing.assert_array_equal(gallery.encoding(gallery.row_of(1)), encodings[2])
@@ -0,0 +1,176 @@
+import itertools
+
+
+def box_iou(a, b):
+    # Boxes are (top, right, bottom, left) as returned by face_recognition
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    union = area_a + area_b - inter
+    return inter / union if union else 0.0
+
+
+def match_boxes(found, reference, min_iou=0.5):
+    # Greedy one-to-one matching; returns (found index, reference index) pairs
+    pairs = []
+    used = set()
+    for i, box in enumerate(found):
+        best, best_iou = None, min_iou
+        for j, ref in enumerate(reference):
+            if j in used:
+                continue
+            iou = box_iou(box, ref)
+            if iou >= best_iou:
+                best, best_iou = j, iou
+        if best is not None:
+            used.add(best)
+            pairs.append((i, best))
+    return pairs
+
+
+def create_cv2_tracker(name):
+    import cv2
+
+    # KCF/CSRT live in cv2.legacy on newer OpenCV builds; MIL ships everywhere
+    for module in (cv2, getattr(cv2, "legacy", None)):
+        factory = getattr(module, f"Tracker{name}_create", None) if module else None
+        if factory is not None:
+            return factory()
+    return None
+
+
+class Track:
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.box = box
+        self.student = None
+        self.confidence = None
+        self.encoded_at = None
+        self.last_iou = 1.0
+        self.misses = 0
+        self.created_at = frame_index
+        self.cv2_tracker = None
+
+
+class FaceTracker:
+    # IoU tracker: full detection runs every detect_interval frames (or when
+    # a track is lost) and faces are only re-encoded when a track is new,
+    # still unknown after retry_interval frames, or jumped to a new box
+    def __init__(self, detect_interval=10, iou_threshold=0.3, max_misses=2,
+                 retry_interval=15, reencode_iou=0.5, refresh_interval=300, cv2_tracker=None):
+        self.detect_interval = detect_interval
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.retry_interval = retry_interval
+        self.reencode_iou = reencode_iou
+        self.refresh_interval = refresh_interval
+        self.cv2_tracker = cv2_tracker
+        self.tracks = []
+        self.frame_index = 0
+        self._last_detection = None
+        self._lost = False
+        self._ids = itertools.count(1)
+
+    def reset(self):
+        self.tracks = []
+        self._last_detection = None
+        self._lost = False
+
+    def needs_detection(self):
+        if self._last_detection is None or self._lost or not self.tracks:
+            return True
+        # Checked before step() advances frame_index for the upcoming frame
+        return self.frame_index + 1 - self._last_detection >= self.detect_interval
+
+    def step(self, frame, face_locations=None):
+        # Advance one frame. Pass face_locations on detection frames;
+        # otherwise tracks are carried forward (and moved by an OpenCV
+        # tracker when one is configured)
+        self.frame_index += 1
+        if face_locations is None:
+            self._follow(frame)
+        else:
+            self._associate(frame, face_locations)
+            self._last_detection = self.frame_index
+        return self.tracks
+
+    def _associate(self, frame, face_locations):
+        pairs = sorted(
+            ((box_iou(track.box, box), t, d)
+             for t, track in enumerate(self.tracks)
+             for d, box in enumerate(face_locations)),
+            reverse=True,
+        )
+        used_tracks, used_boxes = set(), set()
+        for iou, t, d in pairs:
+            if iou < self.iou_threshold:
+                break
+            if t in used_tracks or d in used_boxes:
+                continue
+            used_tracks.add(t)
+            used_boxes.add(d)
+            track = self.tracks[t]
+            track.box = tuple(face_locations[d])
+            track.last_iou = iou
+            track.misses = 0
+            self._start_cv2_tracker(track, frame)
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in used_tracks:
+                track.misses += 1
+            if track.misses <= self.max_misses:
+                survivors.append(track)
+
+        for d, box in enumerate(face_locations):
+            if d not in used_boxes:
+                track = Track(next(self._ids), tuple(box), self.frame_index)
+                self._start_cv2_tracker(track, frame)
+                survivors.append(track)
+
+        self.tracks = survivors
+        self._lost = False
+
+    def _follow(self, frame):
+        if self.cv2_tracker is None:
+            return
+        height, width = frame.shape[:2]
+        for track in self.tracks:
+            if track.cv2_tracker is None:
+                continue
+            ok, (x, y, w, h) = track.cv2_tracker.update(frame)
+            if not ok:
+                # A lost track forces full detection on the next frame
+                track.cv2_tracker = None
+                self._lost = True
+                continue
+            track.box = (max(0, int(y)), min(width, int(x + w)), min(height, int(y + h)), max(0, int(x)))
+
+    def _start_cv2_tracker(self, track, frame):
+        if self.cv2_tracker is None:
+            return
+        top, right, bottom, left = track.box
+        track.cv2_tracker = create_cv2_tracker(self.cv2_tracker)
+        if track.cv2_tracker is not None:
+            track.cv2_tracker.init(frame, (left, top, right - left, bottom - top))
+
+    def needs_encoding(self, track):
+        if track.encoded_at is None:
+            return True
+        age = self.frame_index - track.encoded_at
+        if track.student is None and age >= self.retry_interval:
+            return True
+        if track.last_iou < self.reencode_iou:
+            return True
+        return age >= self.refresh_interval
+
+    def pending_encoding(self):
+        return [track for track in self.tracks if self.needs_encoding(track)]
+
+    def assign(self, track, student, confidence):
+        track.student = student
+        track.confidence = confidence
+        track.encoded_at = self.frame_index
+        track.last_iou = 1.0